@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def eager_tasks(settings, monkeypatch):
+    """Run the background tasks of posts inline, see yatube.test_runner."""
+    from yatube.test_runner import run_now
+
+    settings.POSTS_TASKS_EAGER = True
+    monkeypatch.setattr("django.db.transaction.on_commit", run_now)
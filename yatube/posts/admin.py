@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Post, Group, Comment, Follow
+from . import search
+from .forms import PostForm
+from .models import Post, Group, Comment, Follow, UserStats
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -8,6 +10,16 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = "-пусто-"
+    # images are normalized and shared the same way as on the site
+    form = PostForm
+    fields = ('text', 'author', 'group', 'image')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Look the text up in the full-text index, not by LIKE."""
+        if not search.match_expression(search_term):
+            return queryset, False
+        return (queryset.filter(pk__in=search.matching_ids(search_term)),
+                False)
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -23,7 +35,13 @@ class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'posts_count', 'followers_count',
+                    'following_count')
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
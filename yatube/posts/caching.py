@@ -0,0 +1,94 @@
+"""Cache helper that keeps expiring feed entries from stampeding the DB.
+
+Entries are stored as ``(value, expires_at, delta)``, where ``delta`` is
+how long the value took to compute. Shortly before ``expires_at`` each
+reader recomputes with a probability that grows as the expiry nears and
+with ``delta`` (XFetch), so a busy key is usually refreshed before it
+expires at all. Only the reader holding the recompute lock runs the
+query; the others keep getting the old value, which stays in the cache
+for ``FEED_CACHE_STALE_TIMEOUT`` seconds past its expiry.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# >1 favours earlier recomputation, <1 later
+BETA = 1.0
+# seconds between cache reads while another process recomputes a miss
+POLL_INTERVAL = 0.05
+# returned instead of a value while another reader holds the lock
+BUSY = object()
+
+
+def _lock_key(key: str) -> str:
+    return f"{key}:lock"
+
+
+def _recompute(key: str, compute, timeout: int):
+    start = time.time()
+    value = compute()
+    delta = time.time() - start
+    entry = (value, start + delta + timeout, delta)
+    cache.set(key, entry,
+              timeout=timeout + settings.FEED_CACHE_STALE_TIMEOUT)
+    return value
+
+
+def _is_fresh(expires_at: float, delta: float) -> bool:
+    # 1 - random() lies in (0, 1], so the logarithm is defined
+    early = -delta * BETA * math.log(1 - random.random())
+    return time.time() + early < expires_at
+
+
+def _recompute_locked(key: str, compute, timeout: int):
+    """Recompute ``key`` unless somebody holds its lock, then ``BUSY``."""
+    lock = _lock_key(key)
+    if not cache.add(lock, True, timeout=settings.FEED_CACHE_LOCK_TIMEOUT):
+        return BUSY
+    try:
+        return _recompute(key, compute, timeout)
+    finally:
+        cache.delete(lock)
+
+
+def _wait(key: str, compute, timeout: int):
+    """Wait for the process holding the lock of ``key`` to store it."""
+    deadline = time.time() + settings.FEED_CACHE_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.get(_lock_key(key)) is None:
+            # the holder is done, but its value was not stored (too large
+            # for the backend) or is already evicted
+            value = _recompute_locked(key, compute, timeout)
+            # another waiter got the lock first; its value may not be
+            # stored either, so do not wait for it
+            return compute() if value is BUSY else value
+    # the lock holder died or is too slow, do not keep the reader waiting
+    return compute()
+
+
+def get_or_set(key: str, compute, timeout: int):
+    """Return the cached value of ``key``, computing it at most once.
+
+    ``compute`` is called without arguments and its result is cached for
+    ``timeout`` seconds.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        if _is_fresh(expires_at, delta):
+            return value
+    value = _recompute_locked(key, compute, timeout)
+    if value is not BUSY:
+        return value
+    if entry is not None:
+        # somebody is already refreshing it
+        return entry[0]
+    # nothing to serve yet
+    return _wait(key, compute, timeout)
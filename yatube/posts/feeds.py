@@ -0,0 +1,70 @@
+"""Cache keys of the post feeds and their generation counters.
+
+Every feed has a generation counter in the cache. Cached pages and
+counts embed it in their keys, so bumping the counter on a write makes
+all of them unreachable at once and their TTLs can be long.
+"""
+import time
+
+from django.core.cache import cache
+
+INDEX_FEED = "index_page"
+
+
+def group_feed(group_id) -> str:
+    return f"group_page:{group_id}"
+
+
+def profile_feed(author_id) -> str:
+    return f"profile_page:{author_id}"
+
+
+def follow_feed(user_id) -> str:
+    return f"follow_page:{user_id}"
+
+
+def post_feeds(author_id, *group_ids) -> list:
+    """Feeds a post of ``author_id`` appears in, besides follow feeds."""
+    feeds = [INDEX_FEED, profile_feed(author_id)]
+    feeds.extend(group_feed(group_id) for group_id in group_ids
+                 if group_id is not None)
+    return feeds
+
+
+def _generation_key(feed: str) -> str:
+    return f"generation:{feed}"
+
+
+def generation(feed: str) -> int:
+    key = _generation_key(feed)
+    value = cache.get(key)
+    if value is None:
+        # start from the clock so a counter lost to eviction never
+        # comes back to a generation whose pages are still cached
+        cache.add(key, int(time.time() * 1000000), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def versioned(feed: str) -> str:
+    """Key prefix of the current generation of ``feed``."""
+    return f"{feed}:g{generation(feed)}"
+
+
+def bump(*feeds):
+    """Start a new generation of every feed in ``feeds``."""
+    for feed in feeds:
+        try:
+            cache.incr(_generation_key(feed))
+        except ValueError:
+            # never read, so nothing of it is cached yet
+            pass
+
+
+def cache_page(request, *feeds):
+    """Let the anonymous page cache store the response to ``request``.
+
+    Called by a view before it reads the feeds; the stored page is
+    served until one of ``feeds`` starts a new generation.
+    """
+    request.page_feeds = {feed: generation(feed) for feed in feeds}
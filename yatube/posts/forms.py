@@ -1,5 +1,8 @@
-from django.forms import ModelForm
+from django.core.files.uploadedfile import UploadedFile
+from django.forms import ModelForm, ValidationError
+from PIL import Image
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -14,6 +17,28 @@ class PostForm(ModelForm):
                       "group": "Это всё ...",
                       "image": "Картинка должна быть здесь"}
 
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        if isinstance(image, UploadedFile):
+            try:
+                image = uploads.normalize(image)
+            except (OSError, Image.DecompressionBombError):
+                raise ValidationError("Не удалось прочитать картинку.",
+                                      code="invalid_image")
+            self.instance.image_width = image.width
+            self.instance.image_height = image.height
+            field = self.instance.image.field
+            name = field.generate_filename(self.instance, image.name)
+            if field.storage.exists(name):
+                # the same image is stored already, the post shares it;
+                # the content is kept in case the file is released
+                # before the post is committed, see posts.uploads
+                self.instance._image_content = image
+                image = name
+        elif not image:
+            self.instance.image_width = self.instance.image_height = None
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
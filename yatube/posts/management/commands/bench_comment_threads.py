@@ -0,0 +1,104 @@
+import statistics
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import COMMENT_MAX_DEPTH, Comment, Post, User
+from posts.paginators import CommentPaginator
+
+
+def by_path(post, root) -> list:
+    """The thread read by its path prefix, in one query."""
+    return list(post.comments.subtree(root).select_related('author'))
+
+
+def by_level(post, root) -> list:
+    """The thread read the naive way, one query per level of replies."""
+    comments, level = [root], [root]
+    while level:
+        level = list(Comment.objects.filter(parent__in=level)
+                     .select_related('author'))
+        comments += level
+    return comments
+
+
+def first_page(post) -> list:
+    """The threads of a post page with the first replies of each."""
+    paginator = CommentPaginator(
+        post.comments.threads().select_related('author'),
+        settings.COMMENTS_PAGE_NUM,
+        replies=settings.COMMENT_REPLIES_PREVIEW)
+    return [comment for thread in paginator.first_page()
+            for comment in (thread, *thread.preview_replies)]
+
+
+class Command(BaseCommand):
+    help = ("Time reading deep and wide synthetic comment threads by "
+            "path and by level. The threads are rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=500,
+                            help="Comments in each thread.")
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author, _ = User.objects.get_or_create(username="bench_threads")
+            post = Post.objects.create(text="Benchmark", author=author)
+            threads = {name: self.build(post, author, options['size'], deep)
+                       for name, deep in (("deep", True), ("wide", False))}
+            iterations = options['iterations']
+            for name, root in threads.items():
+                for method, read in (("path", by_path),
+                                     ("per level", by_level)):
+                    self.report(f"{name} {method}",
+                                lambda: read(post, root), iterations)
+            self.report("first page", lambda: first_page(post), iterations)
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def build(post, author, size: int, deep: bool) -> Comment:
+        """Insert a thread of ``size`` comments with known primary keys.
+
+        A deep thread is a chain of replies down to the deepest level,
+        a wide one answers its first comment over and over.
+        """
+        first_pk = (Comment.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        comments = []
+        for pk in range(first_pk, first_pk + size):
+            parent = None
+            if comments:
+                parent = comments[-1] if deep else comments[0]
+                if parent.depth >= COMMENT_MAX_DEPTH:
+                    parent = parent.parent
+            comment = Comment(pk=pk, post=post, author=author,
+                              text=f"Reply {pk}", parent=parent)
+            comment.depth = parent.depth + 1 if parent else 0
+            comment.path = ((parent.path if parent else '')
+                            + Comment.path_segment(pk))
+            comments.append(comment)
+        replies = Counter(pk for comment in comments
+                          for pk in comment.ancestor_ids)
+        for comment in comments:
+            comment.replies_count = replies[comment.pk]
+        Comment.objects.bulk_create(comments, batch_size=500)
+        return comments[0]
+
+    def report(self, name, read, iterations):
+        with CaptureQueriesContext(connection) as queries:
+            comments = read()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            read()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{name:<14} {len(comments):5} comments "
+            f"{len(queries.captured_queries):4} queries, "
+            f"median {statistics.median(timings):8.2f} ms, "
+            f"max {max(timings):8.2f} ms")
@@ -0,0 +1,43 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from posts import feeds
+from posts.views import index
+
+
+class Command(BaseCommand):
+    help = ("Time rendering the first index page with a cold cache, with "
+            "only the post cards cached and with everything cached.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        def cold():
+            cache.clear()
+
+        def warm_cards():
+            # a new post starts a new generation of the feed
+            feeds.bump(feeds.INDEX_FEED)
+
+        scenarios = {"cold": cold, "warm cards": warm_cards,
+                     "warm": lambda: None}
+        for name, prepare in scenarios.items():
+            index(request)
+            timings = []
+            for _ in range(options['iterations']):
+                prepare()
+                start = time.perf_counter()
+                index(request)
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"{name:<10} median {statistics.median(timings):8.2f} ms, "
+                f"max {max(timings):8.2f} ms")
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from yatube.cache_backends.tiered import TIERS, TieredCache
+
+
+class Command(BaseCommand):
+    help = "Show the hit rates of every tier of the tiered caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help="Start counting from zero afterwards.")
+
+    def handle(self, *args, **options):
+        tiered = [alias for alias in settings.CACHES
+                  if isinstance(caches[alias], TieredCache)]
+        if not tiered:
+            self.stdout.write("No tiered caches are configured.")
+        for alias in tiered:
+            cache = caches[alias]
+            hits = cache.stats()['total']
+            requests = sum(hits.values())
+            self.stdout.write(f"{alias}: {requests} reads")
+            for tier in TIERS:
+                rate = hits[tier] / requests if requests else 0
+                self.stdout.write(f"  {tier:<6} {hits[tier]:>10} "
+                                  f"{rate:>7.1%}")
+            if options['reset']:
+                cache.reset_stats()
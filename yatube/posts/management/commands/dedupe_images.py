@@ -0,0 +1,100 @@
+import hashlib
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from posts import feeds, timeline, uploads
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Point the posts whose images have the same bytes at one "
+            "stored file and delete the other copies with their "
+            "thumbnails. Walks the posts in chunks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the copies.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        posts = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .order_by('pk'))
+        start = time.perf_counter()
+        # the first file seen with every content, and the digest of
+        # every name read so far
+        kept = {}
+        digests = {}
+        last_pk = 0
+        read = copies = freed = 0
+        while True:
+            names = list(posts.filter(pk__gt=last_pk)
+                         .values_list('pk', 'image')[:chunk_size])
+            if not names:
+                break
+            last_pk = names[-1][0]
+            for _, name in names:
+                if name in digests:
+                    continue
+                digests[name] = digest = self._digest(name)
+                if digest is None:
+                    continue
+                read += 1
+                if kept.setdefault(digest, name) == name:
+                    continue
+                copies += 1
+                if dry_run:
+                    freed += default_storage.size(name)
+                else:
+                    freed += self._replace(name, kept[digest])
+        elapsed = time.perf_counter() - start
+        verb = "Would free" if dry_run else "Freed"
+        self.stdout.write(
+            f"Read {read} images in {elapsed:.2f} s "
+            f"({read / elapsed if elapsed else 0:.0f} images/s), "
+            f"found {copies} copies. {verb} {freed / 2 ** 20:.1f} MB.")
+
+    @staticmethod
+    def _digest(name):
+        digest = hashlib.sha256()
+        try:
+            with default_storage.open(name, 'rb') as image_file:
+                for chunk in image_file.chunks():
+                    digest.update(chunk)
+        except (OSError, SuspiciousFileOperation):
+            return None
+        return digest.hexdigest()
+
+    @staticmethod
+    def _replace(name, kept_name) -> int:
+        """Point the posts with ``name`` at ``kept_name``, the same bytes.
+
+        Returns the size of the file freed.
+        """
+        kept = (Post.objects.filter(image=kept_name)
+                .values('thumbnails', 'image_width', 'image_height').first())
+        if kept is None:
+            # its posts are gone and the file may be too
+            return 0
+        size = default_storage.size(name)
+        changed = set()
+        authors = set()
+        with transaction.atomic():
+            posts = Post.objects.filter(image=name)
+            for author_id, group_id in posts.values_list('author_id',
+                                                         'group_id'):
+                changed.update(feeds.post_feeds(author_id, group_id))
+                authors.add(author_id)
+            # the kept file has the same size and thumbnails
+            posts.update(image=kept_name, version=F('version') + 1, **kept)
+        feeds.bump(*changed)
+        for author_id in authors:
+            timeline.refresh_followers(author_id)
+        uploads.release(name)
+        return size
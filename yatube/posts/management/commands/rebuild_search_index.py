@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the full-text index of posts in chunks, so that "
+            "writes to the posts are not blocked for long.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        search.install_triggers()
+        start = time.perf_counter()
+        last_pk = 0
+        indexed = 0
+        while True:
+            pks = list(Post.objects.filter(pk__gt=last_pk)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            # the range also covers rows left behind by deleted posts
+            self._reindex(last_pk + 1, pks[-1])
+            indexed += len(pks)
+            last_pk = pks[-1]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE} WHERE rowid > %s",
+                           [last_pk])
+            cursor.execute(f"INSERT INTO {search.TABLE}({search.TABLE}) "
+                           "VALUES ('optimize')")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Indexed {indexed} posts in {elapsed:.2f} s "
+            f"({indexed / elapsed if elapsed else 0:.0f} posts/s).")
+
+    @staticmethod
+    def _reindex(first_pk, last_pk):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE} "
+                           "WHERE rowid BETWEEN %s AND %s",
+                           [first_pk, last_pk])
+            cursor.execute(f"INSERT INTO {search.TABLE}(rowid, text) "
+                           "SELECT id, text FROM posts_post "
+                           "WHERE id BETWEEN %s AND %s",
+                           [first_pk, last_pk])
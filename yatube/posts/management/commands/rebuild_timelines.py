@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ("Deliver the posts missing from follower timelines and drop "
+            "those of unfollowed authors, in chunks of users. Repairs "
+            "fan-outs lost to a restart or a failed task.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--days', type=int,
+                            help="Only deliver the posts of the last days.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        since = None
+        if options['days'] is not None:
+            since = timezone.now() - timedelta(days=options['days'])
+        start = time.perf_counter()
+        last_pk = 0
+        users = added = removed = 0
+        while True:
+            pks = list(User.objects.filter(pk__gt=last_pk)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            chunk_added, chunk_removed = timeline.rebuild(pks, since)
+            added += chunk_added
+            removed += chunk_removed
+            users += len(pks)
+            last_pk = pks[-1]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Rebuilt timelines of {users} users in {elapsed:.2f} s: "
+            f"{added} entries added, {removed} removed.")
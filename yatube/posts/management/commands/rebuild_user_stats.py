@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User, UserStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the author card counters of every user in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk = 0
+        rebuilt = 0
+        while True:
+            pks = list(User.objects.filter(pk__gt=last_pk)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            UserStats.objects.rebuild(pks)
+            rebuilt += len(pks)
+            last_pk = pks[-1]
+        self.stdout.write(f"Rebuilt stats of {rebuilt} users.")
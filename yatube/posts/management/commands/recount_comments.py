@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.comments_count in chunks to repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        actual = (Comment.objects.filter(post=OuterRef('pk'))
+                  .order_by().values('post')
+                  .annotate(total=Count('pk')).values('total'))
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            pks = list(Post.objects.filter(pk__gt=last_pk)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            drifted = list(
+                Post.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+                .order_by()
+                .annotate(actual=Count('comments'))
+                .exclude(comments_count=F('actual'))
+                .values_list('pk', flat=True)
+            )
+            if drifted:
+                # recount inside the UPDATE so concurrent comments are seen
+                repaired += Post.objects.filter(pk__in=drifted).update(
+                    comments_count=Coalesce(Subquery(actual), 0))
+            checked += len(pks)
+            last_pk = pks[-1]
+        self.stdout.write(
+            f"Checked {checked} posts, repaired {repaired} counters.")
@@ -0,0 +1,87 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import feeds, thumbnails, timeline
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Make the missing thumbnails of every post image in chunks, "
+            "rendering them across a pool of processes. Posts whose "
+            "thumbnail is up to date are skipped, so an interrupted run "
+            "resumes where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Processes rendering the thumbnails; "
+                                 "1 renders them in this process.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = max(options['workers'] or 1, 1)
+        posts = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .order_by('pk'))
+        total = posts.count()
+        # the workers touch the storage only; a forked copy of an open
+        # connection must not be shared with them
+        connections.close_all()
+        executor = None
+        render = map
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers,
+                                           initializer=django.setup)
+            render = executor.map
+        start = time.perf_counter()
+        last_pk = 0
+        seen = made = failed = 0
+        try:
+            while True:
+                chunk = list(posts.filter(pk__gt=last_pk)
+                             .only('image', 'thumbnails', 'author_id',
+                                   'group_id')[:chunk_size])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                seen += len(chunk)
+                stale = [post for post in chunk if not self._is_fresh(post)]
+                names = render(thumbnails.render_thumbnails,
+                               [post.image.name for post in stale])
+                bumped = set()
+                authors = set()
+                for post, post_names in zip(stale, names):
+                    if post_names is None:
+                        failed += 1
+                    elif thumbnails.record_thumbnails(post, post_names):
+                        made += 1
+                        bumped.update(feeds.post_feeds(post.author_id,
+                                                       post.group_id))
+                        authors.add(post.author_id)
+                feeds.bump(*bumped)
+                for author_id in authors:
+                    timeline.refresh_followers(author_id)
+                self._report(seen, total, made, failed, start)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Made thumbnails of {made} of {seen} posts in {elapsed:.2f} s "
+            f"({made / elapsed if elapsed else 0:.1f} posts/s), "
+            f"{failed} images could not be read.")
+
+    @staticmethod
+    def _is_fresh(post) -> bool:
+        names = thumbnails.thumbnail_names(post.image.name)
+        return post.renditions == thumbnails.renditions(names)
+
+    def _report(self, seen, total, made, failed, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{seen}/{total} posts, {made} made, {failed} failed, "
+            f"{seen / elapsed if elapsed else 0:.1f} posts/s")
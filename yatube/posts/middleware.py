@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from . import feeds
+
+
+class AnonymousPageCacheMiddleware:
+    """Serve feed pages to readers without a session from the cache.
+
+    Only requests carrying neither a session nor a CSRF cookie are
+    looked up or stored: such a reader cannot be logged in, so the page
+    holds nothing personal. Views opt in with ``feeds.cache_page``, and
+    a stored page is served while the generations of its feeds are the
+    same as when it was rendered, or answered with 304 if the reader
+    has it already.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._is_anonymous(request):
+            return self.get_response(request)
+
+        key = self._key(request)
+        snapshot = self._cached(key)
+        if snapshot is not None:
+            response = self._restore(snapshot)
+            response = get_conditional_response(
+                request, etag=response.get('ETag'), response=response)
+        else:
+            response = self.get_response(request)
+            page_feeds = getattr(request, 'page_feeds', None)
+            if page_feeds is None:
+                return response
+            if self._is_cacheable(request, response):
+                cache.set(key, (page_feeds, self._snapshot(response)),
+                          timeout=settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        # the same URL renders differently for readers with a session
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    @staticmethod
+    def _is_anonymous(request) -> bool:
+        return (request.method in ('GET', 'HEAD')
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES
+                and settings.CSRF_COOKIE_NAME not in request.COOKIES)
+
+    @staticmethod
+    def _key(request) -> str:
+        url = request.build_absolute_uri().encode()
+        return f"anonymous_page:{hashlib.md5(url).hexdigest()}"
+
+    @staticmethod
+    def _cached(key: str):
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        page_feeds, snapshot = cached
+        if any(feeds.generation(feed) != value
+               for feed, value in page_feeds.items()):
+            return None
+        return snapshot
+
+    @staticmethod
+    def _snapshot(response) -> tuple:
+        # the handler changes and closes every response it serves, and
+        # a cached object is shared by the threads of the process
+        return response.status_code, response.content, list(response.items())
+
+    @staticmethod
+    def _restore(snapshot) -> HttpResponse:
+        status, content, headers = snapshot
+        response = HttpResponse(content, status=status)
+        for name, value in headers:
+            response[name] = value
+        return response
+
+    @staticmethod
+    def _is_cacheable(request, response) -> bool:
+        return (response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_USED')
+                and 'private' not in response.get('Cache-Control', ''))
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+def fill_comments_count(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    counts = (Comment.objects.order_by().values('post_id')
+              .annotate(total=models.Count('pk')))
+    for row in counts.iterator():
+        Post.objects.filter(pk=row['post_id']).update(
+            comments_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_post_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# the index as this migration creates it; posts.search may change later
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts "
+    "USING fts5(text, tokenize='unicode61 remove_diacritics 2')"
+)
+TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+        AFTER DELETE ON posts_post BEGIN
+            DELETE FROM posts_post_fts WHERE rowid = old.id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            UPDATE posts_post_fts SET text = new.text WHERE rowid = old.id;
+        END""",
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for trigger in TRIGGERS:
+        schema_editor.execute(trigger)
+    schema_editor.execute("INSERT INTO posts_post_fts(rowid, text) "
+                          "SELECT id, text FROM posts_post")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for event in ('insert', 'delete', 'update'):
+        schema_editor.execute(
+            f"DROP TRIGGER IF EXISTS posts_post_fts_{event}")
+    schema_editor.execute("DROP TABLE IF EXISTS posts_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_comment_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -16,6 +18,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Posts with everything a post card renders fetched up front."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     """Author's publication."""
 
@@ -30,12 +38,85 @@ class Post(models.Model):
                               related_name='posts',
                               blank=True, null=True)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # size of the stored image, see posts.uploads; not width_field and
+    # height_field, which open the file whenever a post without them loads
+    image_width = models.PositiveIntegerField(blank=True, null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True,
+                                               editable=False)
+    # JSON list of the ready thumbnails of the image, see posts.thumbnails
+    thumbnails = models.TextField(blank=True, default='', editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    # changes with everything shown on the post card
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def card_cache_key(self) -> str:
+        return f"post_card:{self.pk}:v{self.version}"
+
+    @property
+    def renditions(self) -> list:
+        """Ready thumbnails of the image with their url and size."""
+        return json.loads(self.thumbnails) if self.thumbnails else []
+
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-pk']
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+            # posts sharing a stored image, see posts.uploads
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
+
+
+# hex digits of a primary key in the materialized path of a comment
+PATH_STEP = 8
+PATH_MAX_LENGTH = 255
+# replies to the deepest comments go next to them instead
+COMMENT_MAX_DEPTH = PATH_MAX_LENGTH // PATH_STEP - 1
+# sorts after every digit of a path
+PATH_END = '~'
+
+
+class CommentQuerySet(models.QuerySet):
+    def threads(self):
+        """Top-level comments, each starting a thread of replies."""
+        return self.filter(depth=0)
+
+    def subtree(self, comment):
+        """``comment`` and all its replies in thread order.
+
+        The replies share the path of ``comment`` as a prefix, so the
+        whole subtree is one range of the path index however deep it is.
+        """
+        return self.filter(post_id=comment.post_id,
+                           path__gte=comment.path,
+                           path__lt=comment.path + PATH_END).order_by('path')
+
+    def previews(self, comments, limit: int):
+        """The first ``limit`` replies under each of ``comments``, unordered.
+
+        One query for all of them: each thread is read as a range of the
+        path index that stops after ``limit`` rows.
+        """
+        threads = models.Q()
+        for comment in comments:
+            replies = (self.model.objects
+                       .filter(post_id=comment.post_id,
+                               path__gt=comment.path,
+                               path__lt=comment.path + PATH_END)
+                       .order_by('path').values('pk')[:limit])
+            threads |= models.Q(pk__in=replies)
+        if not threads:
+            return self.none()
+        return self.filter(threads).order_by()
 
 
 class Comment(models.Model):
@@ -47,12 +128,35 @@ class Comment(models.Model):
                                related_name='comments')
     text = models.TextField()
     created = models.DateTimeField('date published', auto_now_add=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE,
+                               related_name='replies',
+                               blank=True, null=True)
+    # primary keys of the ancestors and of the comment itself
+    path = models.CharField(max_length=PATH_MAX_LENGTH, editable=False,
+                            default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @staticmethod
+    def path_segment(pk: int) -> str:
+        return format(pk, f'0{PATH_STEP}x')
+
+    @property
+    def ancestor_ids(self) -> list:
+        return [int(self.path[i:i + PATH_STEP], 16)
+                for i in range(0, len(self.path) - PATH_STEP, PATH_STEP)]
+
     class Meta:
         ordering = ['-created']
+        indexes = [models.Index(fields=['post', 'depth', 'created'],
+                                name='comment_post_thread_idx'),
+                   models.Index(fields=['post', 'path'],
+                                name='comment_post_path_idx')]
 
 
 class Follow(models.Model):
@@ -68,3 +172,67 @@ class Follow(models.Model):
         constraints = [models.UniqueConstraint(
             fields=["user", "author"], name="unique follow"
         )]
+        indexes = [models.Index(fields=["author", "user"],
+                                name="follow_author_user_idx")]
+
+
+class UserStatsQuerySet(models.QuerySet):
+    def rebuild(self, user_ids):
+        """Recount the stats of ``user_ids`` from the source tables."""
+        user_ids = list(user_ids)
+
+        def totals(queryset, field):
+            return dict(queryset.filter(**{f'{field}__in': user_ids})
+                        .order_by().values_list(field)
+                        .annotate(total=models.Count('pk')))
+
+        posts = totals(Post.objects, 'author')
+        followers = totals(Follow.objects, 'author')
+        following = totals(Follow.objects, 'user')
+        stats = [self.model(user_id=user_id,
+                            posts_count=posts.get(user_id, 0),
+                            followers_count=followers.get(user_id, 0),
+                            following_count=following.get(user_id, 0))
+                 for user_id in user_ids]
+        existing = set(self.filter(pk__in=user_ids)
+                       .values_list('pk', flat=True))
+        self.bulk_create([item for item in stats
+                          if item.user_id not in existing])
+        self.bulk_update([item for item in stats if item.user_id in existing],
+                         ['posts_count', 'followers_count',
+                          'following_count'])
+
+
+class UserStats(models.Model):
+    """Precomputed counters shown on the author card."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Статистика {self.user}"
+
+
+class TimelineEntry(models.Model):
+    """Post delivered to a follower's timeline by fan-out on write."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.post} в ленте {self.user}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=["user", "post"], name="unique timeline entry"
+        )]
+        indexes = [models.Index(fields=["user", "-pub_date", "-post"],
+                                name="timeline_user_date_idx")]
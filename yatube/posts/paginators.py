@@ -0,0 +1,201 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.utils.functional import cached_property
+
+from . import caching
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(item, date_field: str = 'pub_date') -> str:
+    """Opaque token pointing at the position of ``item`` in a feed."""
+    raw = f"{getattr(item, date_field).isoformat()}|{item.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        pub_date, pk = raw.decode().split("|")
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+def add_cursors(page: Page, date_field: str = 'pub_date') -> Page:
+    """Attach the cursors of the neighbouring pages to ``page``."""
+    # a cursor past the last row leads to an empty page
+    empty = not len(page)
+    page.next_cursor = (encode_cursor(page[-1], date_field)
+                        if page.has_next() and not empty else None)
+    page.previous_cursor = (encode_cursor(page[0], date_field)
+                            if page.has_previous() and not empty else None)
+    return page
+
+
+class CursorPage(Page):
+    """Page fetched by a keyset seek; it has no number."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Page after cursor>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class FeedPaginator(Paginator):
+    """Paginator for post feeds ordered by ``(-pub_date, -pk)``.
+
+    Besides ``?page=N`` it serves pages relative to a cursor, which costs
+    one index seek no matter how deep the page is.
+    """
+
+    date_field = 'pub_date'
+    pk_field = 'pk'
+
+    def __init__(self, *args, count_key: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        """Total number of rows, cached under ``count_key`` if given."""
+        if self.count_key is None:
+            return super().count
+
+        def total():
+            return super(FeedPaginator, self).count
+
+        return caching.get_or_set(self.count_key, total,
+                                  settings.FEED_COUNT_TIMEOUT)
+
+    def page_window(self, number: int, on_each_side: int = 2,
+                    on_ends: int = 1) -> list:
+        """Page numbers around ``number``; ``None`` marks a gap."""
+        last = self.num_pages
+        shown = {*range(1, on_ends + 1),
+                 *range(max(number - on_each_side, 1),
+                        min(number + on_each_side, last) + 1),
+                 *range(max(last - on_ends + 1, 1), last + 1)}
+        window, previous = [], 0
+        for i in sorted(shown):
+            if i - previous > 1:
+                window.append(None)
+            window.append(i)
+            previous = i
+        return window
+
+    def to_posts(self, rows) -> list:
+        """Map the rows of ``object_list`` to the posts they show."""
+        return rows
+
+    def _get_page(self, object_list, number, paginator):
+        return self.make_page(self.to_posts(object_list), number)
+
+    def make_page(self, posts, number: int) -> Page:
+        """Numbered page with neighbour cursors and a bounded page window."""
+        page = add_cursors(Page(posts, number, self), self.date_field)
+        page.page_window = self.page_window(number)
+        return page
+
+    def cursor_page(self, after: str = None, before: str = None) -> Page:
+        if not (after or before):
+            return self.first_page()
+        try:
+            if after:
+                return self._page_after(*decode_cursor(after))
+            return self._page_before(*decode_cursor(before))
+        except InvalidCursor:
+            return self.get_page(1)
+
+    def first_page(self) -> Page:
+        """The newest page, found without counting the rows."""
+        return self._page_after(None, None, has_previous=False)
+
+    def _seek(self, pub_date, pk, older: bool) -> list:
+        date_field, pk_field = self.date_field, self.pk_field
+        if older:
+            bound, skip, order = 'lte', 'gte', '-'
+        else:
+            bound, skip, order = 'gte', 'lte', ''
+        rows = self.object_list
+        if pub_date is not None:
+            rows = (rows.filter(**{f'{date_field}__{bound}': pub_date})
+                    .exclude(**{date_field: pub_date,
+                                f'{pk_field}__{skip}': pk}))
+        return list(rows.order_by(order + date_field, order + pk_field)
+                    [:self.per_page + 1])
+
+    def _page_after(self, pub_date, pk, has_previous: bool = True) -> Page:
+        rows = self._seek(pub_date, pk, older=True)
+        has_next = len(rows) > self.per_page
+        posts = self.to_posts(rows[:self.per_page])
+        return add_cursors(CursorPage(posts, self, has_next=has_next,
+                                      has_previous=has_previous),
+                           self.date_field)
+
+    def _page_before(self, pub_date, pk) -> Page:
+        rows = self._seek(pub_date, pk, older=False)
+        has_previous = len(rows) > self.per_page
+        posts = self.to_posts(rows[:self.per_page][::-1])
+        return add_cursors(CursorPage(posts, self, has_next=True,
+                                      has_previous=has_previous),
+                           self.date_field)
+
+
+class TimelinePaginator(FeedPaginator):
+    """Pages through ``TimelineEntry`` rows and shows their posts."""
+
+    pk_field = 'post_id'
+
+    def to_posts(self, rows) -> list:
+        return [entry.post for entry in rows]
+
+
+class CommentPaginator(FeedPaginator):
+    """Pages through the threads of a post, newest first.
+
+    Each top-level comment on a page comes with the first ``replies``
+    comments of its thread in ``preview_replies``, all of them fetched
+    by one query however many threads, or however deep, there are.
+    """
+
+    date_field = 'created'
+
+    def __init__(self, *args, replies: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replies = replies
+
+    def to_posts(self, rows) -> list:
+        threads = {}
+        for comment in rows:
+            comment.preview_replies = []
+            if comment.replies_count and self.replies:
+                threads[comment.path] = comment
+        if threads:
+            previews = (self.object_list.model.objects
+                        .previews(threads.values(), self.replies)
+                        .select_related('author'))
+            lengths = {len(path) for path in threads}
+            for reply in sorted(previews, key=lambda reply: reply.path):
+                # the path of a reply starts with that of its thread
+                for length in lengths:
+                    if reply.path[:length] in threads:
+                        threads[reply.path[:length]].preview_replies.append(
+                            reply)
+                        break
+        return rows
@@ -0,0 +1,143 @@
+"""Full-text search over posts with an SQLite FTS5 index.
+
+``posts_post_fts`` holds a copy of ``Post.text`` under the primary key
+of the post as its rowid. Triggers on ``posts_post`` keep it in sync
+with every write, including bulk updates and raw SQL, and
+``rebuild_search_index`` repairs it in chunks if it ever drifts.
+"""
+import base64
+import binascii
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginators import CursorPage, InvalidCursor
+
+TABLE = 'posts_post_fts'
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} "
+    "USING fts5(text, tokenize='unicode61 remove_diacritics 2')"
+)
+TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+        END""",
+    # counters and versions change often and do not touch the index
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            UPDATE {TABLE} SET text = new.text WHERE rowid = old.id;
+        END""",
+)
+
+# marks around the matched words, replaced after the snippet is escaped
+MATCH_START, MATCH_END = "\x02", "\x03"
+SNIPPET_TOKENS = 32
+
+WORDS = re.compile(r"\w+")
+
+
+def install_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Create the triggers keeping the index in sync, if missing.
+
+    Also runs after every ``migrate``: SQLite drops the triggers with
+    the table whenever a migration rebuilds ``posts_post``.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        if TABLE not in db.introspection.table_names(cursor):
+            return
+        for trigger in TRIGGERS:
+            cursor.execute(trigger)
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query finding posts with every word of ``query``.
+
+    Words are quoted, so the syntax of FTS5 queries cannot break the
+    search, and the last one may be unfinished.
+    """
+    words = WORDS.findall(query)
+    if not words:
+        return ''
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def matching_ids(query: str) -> RawSQL:
+    """Subquery of the primary keys of posts matching ``query``."""
+    return RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s",
+                  [match_expression(query)])
+
+
+def _encode_cursor(rank: float, pk: int) -> str:
+    raw = f"{rank!r}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        rank, pk = raw.decode().split("|")
+        return float(rank), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+def _highlight(snippet: str) -> str:
+    return mark_safe(escape(snippet).replace(MATCH_START, "<mark>")
+                     .replace(MATCH_END, "</mark>"))
+
+
+def search_posts(query: str, per_page: int, after: str = None) -> CursorPage:
+    """Posts matching ``query``, best first, from the ``after`` cursor on.
+
+    One FTS5 query ranks the matches and cuts the snippets of the page
+    only, one more fetches the posts. Every post gets ``snippet`` with
+    the matched words in ``<mark>``.
+    """
+    match = match_expression(query)
+    rows = []
+    if match:
+        sql = (f"SELECT rowid, rank, snippet({TABLE}, 0, %s, %s, '…', %s) "
+               f"FROM {TABLE} WHERE {TABLE} MATCH %s")
+        params = [MATCH_START, MATCH_END, SNIPPET_TOKENS, match]
+        if after:
+            try:
+                rank, pk = _decode_cursor(after)
+            except InvalidCursor:
+                after = None
+            else:
+                # ties in rank come in the order of the rowid
+                sql += " AND (rank > %s OR (rank = %s AND rowid > %s))"
+                params += [rank, rank, pk]
+        sql += " ORDER BY rank LIMIT %s"
+        params.append(per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+    posts = Post.objects.feed().in_bulk([pk for pk, _, _ in rows[:per_page]])
+    results = []
+    for pk, _, snippet in rows[:per_page]:
+        # the post may have been deleted since
+        if pk in posts:
+            posts[pk].snippet = _highlight(snippet)
+            results.append(posts[pk])
+    page = CursorPage(results, None, has_next=len(rows) > per_page,
+                      has_previous=bool(after))
+    page.next_cursor = None
+    if page.has_next():
+        last_pk, last_rank, _ = rows[per_page - 1]
+        page.next_cursor = _encode_cursor(last_rank, last_pk)
+    return page
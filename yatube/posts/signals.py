@@ -0,0 +1,164 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import feeds, tasks, thumbnails, timeline, uploads
+from .models import (COMMENT_MAX_DEPTH, Comment, Follow, Group, Post, User,
+                     UserStats)
+
+
+def _change_stats(user_id, **deltas):
+    changes = {field: Greatest(F(field) + delta, 0)
+               for field, delta in deltas.items()}
+    updated = UserStats.objects.filter(pk=user_id).update(**changes)
+    # decrements may come from a cascade that already removed the user
+    if not updated and min(deltas.values()) > 0:
+        UserStats.objects.rebuild([user_id])
+
+
+def _post_changed(post_id, *old_group_ids):
+    """Start new generations of every feed showing the post."""
+    post = (Post.objects.filter(pk=post_id)
+            .values_list('author_id', 'group_id').first())
+    if post is None:
+        return
+    author_id, group_id = post
+    feeds.bump(*feeds.post_feeds(author_id, group_id, *old_group_ids))
+    timeline.refresh_followers_later(author_id)
+
+
+@receiver(pre_save, sender=Comment)
+def place_reply(sender, instance, raw=False, **kwargs):
+    """Put a new reply one level below its parent, within the limit."""
+    parent = instance.parent
+    if raw or instance.pk or parent is None:
+        return
+    if parent.depth >= COMMENT_MAX_DEPTH:
+        instance.parent = parent = parent.parent
+    instance.depth = parent.depth + 1
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if not created:
+        return
+    if not raw:
+        # the path needs the primary key, known only now
+        prefix = instance.parent.path if instance.parent_id else ''
+        instance.path = prefix + Comment.path_segment(instance.pk)
+        Comment.objects.filter(pk=instance.pk).update(path=instance.path)
+        if instance.parent_id:
+            Comment.objects.filter(pk__in=instance.ancestor_ids).update(
+                replies_count=F('replies_count') + 1)
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=F('comments_count') + 1,
+        version=F('version') + 1)
+    _post_changed(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # also fires for every comment removed by a cascade
+    if instance.parent_id:
+        Comment.objects.filter(pk__in=instance.ancestor_ids,
+                               replies_count__gt=0).update(
+            replies_count=F('replies_count') - 1)
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1,
+        version=F('version') + 1)
+    _post_changed(instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, raw=False, **kwargs):
+    instance._old_group_id, instance._old_image = None, ''
+    if instance.pk and not raw:
+        old = (Post.objects.filter(pk=instance.pk)
+               .values_list('group_id', 'image').first())
+        if old is not None:
+            instance._old_group_id, instance._old_image = old
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    old_image = getattr(instance, '_old_image', '') or ''
+    image_changed = (instance.image.name or '') != old_image
+    # the content of a shared image, see posts.forms
+    content = instance.__dict__.pop('_image_content', None)
+    feeds.bump(*feeds.post_feeds(instance.author_id, instance.group_id,
+                                 old_group_id))
+    if created:
+        _change_stats(instance.author_id, posts_count=1)
+        tasks.run(timeline.fan_out_post, instance.pk)
+    else:
+        changes = {'version': F('version') + 1}
+        if image_changed:
+            # the thumbnails of the old image must not be shown
+            changes['thumbnails'] = instance.thumbnails = ''
+        Post.objects.filter(pk=instance.pk).update(**changes)
+        timeline.refresh_followers_later(instance.author_id)
+    if image_changed and not raw:
+        if content is not None:
+            tasks.run(uploads.store, instance.image.name, content,
+                      queue='images')
+        if instance.image:
+            tasks.run(thumbnails.make_thumbnails, instance.pk, queue='images')
+        if old_image:
+            tasks.run(uploads.release, old_image, queue='images')
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    feeds.bump(*feeds.post_feeds(instance.author_id, instance.group_id))
+    _change_stats(instance.author_id, posts_count=-1)
+    timeline.refresh_followers_later(instance.author_id)
+    if instance.image:
+        tasks.run(uploads.release, instance.image.name, queue='images')
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    feeds.bump(feeds.INDEX_FEED, feeds.group_feed(instance.pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_cards_changed(sender, instance, created=False, **kwargs):
+    """Renew the cards showing the group; before its posts lose it."""
+    if created:
+        return
+    posts = Post.objects.filter(group_id=instance.pk)
+    author_ids = set(posts.values_list('author_id', flat=True))
+    posts.update(version=F('version') + 1)
+    feeds.bump(*map(feeds.profile_feed, author_ids))
+    for author_id in author_ids:
+        timeline.refresh_followers_later(author_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        # the author cards on both profiles show the counters
+        feeds.bump(feeds.profile_feed(instance.author_id),
+                   feeds.profile_feed(instance.user_id))
+        _change_stats(instance.author_id, followers_count=1)
+        _change_stats(instance.user_id, following_count=1)
+        tasks.run(timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feeds.bump(feeds.profile_feed(instance.author_id),
+               feeds.profile_feed(instance.user_id))
+    _change_stats(instance.author_id, followers_count=-1)
+    _change_stats(instance.user_id, following_count=-1)
+    tasks.run(timeline.purge, instance.user_id, instance.author_id)
@@ -0,0 +1,57 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+# coalesced tasks queued but not started yet
+_waiting = set()
+_lock = threading.Lock()
+
+
+def _executor(queue: str) -> ThreadPoolExecutor:
+    # one worker per queue keeps the tasks of a queue in submission order
+    with _lock:
+        if queue not in _executors:
+            _executors[queue] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"posts-{queue}")
+        return _executors[queue]
+
+
+def _execute(func, args, coalesce=False):
+    if coalesce:
+        # changes committed from now on need another run
+        with _lock:
+            _waiting.discard((func, args))
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        connections.close_all()
+
+
+def _submit(func, args, queue, coalesce):
+    if coalesce:
+        with _lock:
+            if (func, args) in _waiting:
+                return
+            _waiting.add((func, args))
+    _executor(queue).submit(_execute, func, args, coalesce)
+
+
+def run(func, *args, queue: str = "default", coalesce: bool = False):
+    """Run ``func(*args)`` in a background thread once the current
+    transaction commits, or in this one with ``POSTS_TASKS_EAGER``.
+
+    With ``coalesce`` the call is dropped if the same one is still
+    waiting in the queue, as it will see the committed changes anyway.
+    """
+    if settings.POSTS_TASKS_EAGER:
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(lambda: _submit(func, args, queue, coalesce))
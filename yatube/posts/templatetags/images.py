@@ -0,0 +1,28 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def srcset(renditions, media_type):
+    """``srcset`` of the ``renditions`` of a post in ``media_type``."""
+    return ", ".join(f"{rendition['url']} {rendition['width']}w"
+                     for rendition in renditions
+                     if rendition.get("type") == media_type)
+
+
+@register.filter
+def widest(renditions, media_type):
+    """The widest of the ``renditions`` of a post in ``media_type``."""
+    return max((rendition for rendition in renditions
+                if rendition.get("type") == media_type),
+               key=lambda rendition: rendition["width"], default=None)
+
+
+@register.filter
+def loads_eagerly(post, eager) -> bool:
+    """Whether the image of ``post`` loads at once, see post_card.html.
+
+    False for a post without an image, so its card is cached once.
+    """
+    return bool(post.image and eager)
@@ -0,0 +1,109 @@
+"""Page shells shared by all users, with per-user holes punched in them.
+
+``{% shell key "name" [vary_on ...] %}...{% endshell %}`` renders its
+body once per ``key`` and ``vary_on`` values for everybody and caches
+it. Parts of the body that depend on the user are written as
+``{% hole "template.html" arg=value %}``: inside a shell they leave a
+marker and their arguments in the cached entry, and every request fills
+the markers in by rendering the small templates with its own context.
+Outside a shell, or with an empty key, a hole is rendered in place. A
+shell nested in another one hands its holes over to the outer shell, so
+it can be cached on its own.
+"""
+import re
+
+from django import template
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+register = template.Library()
+
+HOLE = "<!--hole:{}-->"
+HOLES = re.compile(r"<!--hole:(\d+)-->")
+
+
+def _render_hole(context, template_name, values) -> str:
+    fragment = context.template.engine.get_template(template_name)
+    with context.push(**values):
+        return fragment.render(context)
+
+
+def _punch_again(holes, outer_holes):
+    def punch(match):
+        outer_holes.append(holes[int(match[1])])
+        return HOLE.format(len(outer_holes) - 1)
+    return punch
+
+
+class ShellNode(template.Node):
+    def __init__(self, nodelist, key, name, vary_on):
+        self.nodelist = nodelist
+        self.key = key
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = self.key.resolve(context)
+        if not key:
+            return self.nodelist.render(context)
+        vary_on = "".join(f":{value.resolve(context)}"
+                          for value in self.vary_on)
+        key = f"{key}:shell:{self.name}{vary_on}"
+        cached = cache.get(key)
+        if cached is None:
+            # the shell must not depend on who renders it first
+            with context.push(shell_holes=[], user=AnonymousUser(),
+                              csrf_token=None):
+                html = self.nodelist.render(context)
+                cached = (html, context["shell_holes"])
+            cache.set(key, cached, timeout=settings.FEED_CACHE_TIMEOUT)
+        html, holes = cached
+        outer_holes = context.get("shell_holes")
+        if outer_holes is not None:
+            return HOLES.sub(_punch_again(holes, outer_holes), html)
+        return HOLES.sub(
+            lambda match: _render_hole(context, *holes[int(match[1])]), html)
+
+
+class HoleNode(template.Node):
+    def __init__(self, template_name, kwargs):
+        self.template_name = template_name
+        self.kwargs = kwargs
+
+    def render(self, context):
+        values = {name: value.resolve(context)
+                  for name, value in self.kwargs.items()}
+        holes = context.get("shell_holes")
+        if holes is None:
+            return _render_hole(context, self.template_name, values)
+        holes.append((self.template_name, values))
+        return HOLE.format(len(holes) - 1)
+
+
+@register.tag
+def shell(parser, token):
+    """Usage: ``{% shell cache_key "name" [vary_on ...] %}...``."""
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' takes a cache key and a name.")
+    nodelist = parser.parse(("endshell",))
+    parser.delete_first_token()
+    return ShellNode(nodelist, parser.compile_filter(bits[1]),
+                     bits[2].strip("\"'"),
+                     [parser.compile_filter(bit) for bit in bits[3:]])
+
+
+@register.tag
+def hole(parser, token):
+    """Usage: ``{% hole "template.html" name=value ... %}``."""
+    bits = token.split_contents()
+    if len(bits) < 2 or bits[1][0] not in "\"'":
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' takes a quoted template name.")
+    kwargs = template.base.token_kwargs(bits[2:], parser)
+    if len(kwargs) != len(bits) - 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' takes only name=value arguments.")
+    return HoleNode(bits[1][1:-1], kwargs)
@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .. import caching
+
+
+class Counter:
+    def __init__(self, value="fresh", delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+class GetOrSetTest(SimpleTestCase):
+    key = "feed:g1:1"
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def store(self, value, expires_in, delta=0.0):
+        cache.set(self.key, (value, time.time() + expires_in, delta))
+
+    def test_fresh_entry_is_not_recomputed(self):
+        compute = Counter()
+        self.assertEqual(caching.get_or_set(self.key, compute, 60), "fresh")
+        self.assertEqual(caching.get_or_set(self.key, compute, 60), "fresh")
+        self.assertEqual(compute.calls, 1)
+
+    def test_expired_entry_is_recomputed_by_lock_holder(self):
+        self.store("stale", expires_in=-1)
+        compute = Counter()
+        self.assertEqual(caching.get_or_set(self.key, compute, 60), "fresh")
+        self.assertIsNone(cache.get(caching._lock_key(self.key)))
+
+    def test_stale_entry_is_served_while_locked(self):
+        self.store("stale", expires_in=-1)
+        cache.add(caching._lock_key(self.key), True)
+        compute = Counter()
+        self.assertEqual(caching.get_or_set(self.key, compute, 60), "stale")
+        self.assertEqual(compute.calls, 0)
+
+    def test_slow_entry_is_recomputed_early(self):
+        # a value taking a minute to compute is due well before expiry
+        self.store("stale", expires_in=1, delta=60)
+        with mock.patch.object(caching.random, "random", return_value=0.5):
+            self.assertEqual(caching.get_or_set(self.key, Counter(), 60),
+                             "fresh")
+
+    @override_settings(FEED_CACHE_LOCK_TIMEOUT=0.1)
+    def test_miss_computes_when_lock_is_never_released(self):
+        cache.add(caching._lock_key(self.key), True)
+        compute = Counter()
+        self.assertEqual(caching.get_or_set(self.key, compute, 60), "fresh")
+        self.assertEqual(compute.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        compute = Counter(delay=0.2)
+        results = []
+
+        def read():
+            results.append(caching.get_or_set(self.key, compute, 60))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["fresh"] * 8)
+        self.assertEqual(compute.calls, 1)
+
+    def test_waiters_stop_when_value_is_not_stored(self):
+        compute = Counter(delay=0.2)
+        results = []
+        set_entry = cache.set
+
+        def drop(key, *args, **kwargs):
+            # too large for the backend, or evicted at once
+            if key != self.key:
+                set_entry(key, *args, **kwargs)
+
+        def read():
+            start = time.time()
+            caching.get_or_set(self.key, compute, 60)
+            results.append(time.time() - start)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        with mock.patch.object(cache, "set", drop):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 4)
+        self.assertLess(max(results), 1)
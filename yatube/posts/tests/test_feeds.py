@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import feeds
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedGenerationTest(TestCase):
+    """Writes start new generations of the feeds they change."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Hagrid")
+        cls.reader = User.objects.create(username="Fang")
+        cls.group = Group.objects.create(title="Creatures",
+                                         description="Care of",
+                                         slug="creatures")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text="Yer a wizard",
+                                       author=cls.author, group=cls.group)
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def generations(self):
+        return {feed: feeds.generation(feed) for feed in (
+            feeds.INDEX_FEED,
+            feeds.group_feed(self.group.pk),
+            feeds.profile_feed(self.author.pk),
+            feeds.follow_feed(self.reader.pk),
+        )}
+
+    def assertAllBumped(self, before):
+        for feed, value in self.generations().items():
+            with self.subTest(feed=feed):
+                self.assertGreater(value, before[feed])
+
+    def test_new_post_bumps_every_feed_showing_it(self):
+        before = self.generations()
+        Post.objects.create(text="Norbert", author=self.author,
+                            group=self.group)
+        self.assertAllBumped(before)
+
+    def test_comment_bumps_every_feed_showing_the_post(self):
+        before = self.generations()
+        Comment.objects.create(text="Woof", author=self.reader,
+                               post=self.post)
+        self.assertAllBumped(before)
+
+    def test_unfollow_bumps_follow_feed(self):
+        before = feeds.generation(feeds.follow_feed(self.reader.pk))
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertGreater(feeds.generation(feeds.follow_feed(self.reader.pk)),
+                           before)
@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -7,7 +8,10 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from PIL import Image
 
+from .. import uploads
+from ..forms import PostForm
 from ..models import Post, Group, Comment
 
 
@@ -73,7 +77,7 @@ class PostCreateEditFormTest(TestFormsSetUpClassMixin, TestCase):
             text="Avada Kedavra",
             group=self.group.id,
             author=self.user,
-            image=f"posts/{self.test_image}"
+            image__regex=rf"^posts/[0-9a-f]{{64}}\.{uploads.EXTENSION}$"
         ).exists())
 
     def test_edit_post_form_change_database_entry(self):
@@ -103,6 +107,93 @@ class PostCreateEditFormTest(TestFormsSetUpClassMixin, TestCase):
         ).exists())
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=500)
+class PostImageUploadTest(TestFormsSetUpClassMixin, TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def upload(self, image, format, **params):
+        buffer = io.BytesIO()
+        image.save(buffer, format, **params)
+        self.authorized_user.post(
+            reverse("posts:new_post"),
+            data={"text": "Lumos",
+                  "image": SimpleUploadedFile(f"photo.{format.lower()}",
+                                              buffer.getvalue())})
+        post = Post.objects.latest("pk")
+        with post.image.open("rb") as image_file:
+            stored = Image.open(image_file)
+            stored.load()
+        return post, stored
+
+    def test_camera_photo_is_upright_small_and_without_metadata(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotated by 90 degrees
+        exif[0x010F] = "Nimbus 2000"  # camera maker
+        post, stored = self.upload(Image.new("RGB", (1200, 600)), "JPEG",
+                                   exif=exif)
+        self.assertEqual(stored.format, uploads.FORMAT)
+        self.assertEqual(stored.size, (250, 500))
+        self.assertEqual((post.image_width, post.image_height), (250, 500))
+        self.assertFalse(stored.getexif())
+        self.assertTrue(post.image.name.endswith(f".{uploads.EXTENSION}"))
+
+    def test_same_image_is_stored_once(self):
+        first, _ = self.upload(Image.new("RGB", (30, 20)), "PNG")
+        second, _ = self.upload(Image.new("RGB", (30, 20)), "PNG")
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual((second.image_width, second.image_height), (30, 20))
+
+    def test_image_released_before_commit_is_stored_again(self):
+        first, _ = self.upload(Image.new("RGB", (30, 20)), "PNG")
+        buffer = io.BytesIO()
+        Image.new("RGB", (30, 20)).save(buffer, "PNG")
+        form = PostForm(data={"text": "Nox"},
+                        files={"image": SimpleUploadedFile("photo.png",
+                                                           buffer.getvalue())},
+                        instance=Post(author=self.user))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["image"], first.image.name)
+        first.delete()
+        self.assertFalse(first.image.storage.exists(first.image.name))
+        second = form.save()
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertTrue(second.image.storage.exists(second.image.name))
+
+    def test_admin_upload_is_normalized(self):
+        admin = User.objects.create_superuser("Dumbledore", "", "sherbet")
+        self.authorized_user.force_login(admin)
+        buffer = io.BytesIO()
+        Image.new("RGB", (1200, 600)).save(buffer, "PNG")
+        response = self.authorized_user.post(
+            reverse("admin:posts_post_add"),
+            data={"text": "Lumos", "author": self.user.pk,
+                  "image": SimpleUploadedFile("photo.png",
+                                              buffer.getvalue())})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.latest("pk")
+        self.assertTrue(post.image.name.endswith(f".{uploads.EXTENSION}"))
+        self.assertEqual((post.image_width, post.image_height), (500, 250))
+
+    def test_small_image_keeps_its_size(self):
+        post, stored = self.upload(Image.new("RGB", (300, 200)), "PNG")
+        self.assertEqual(stored.size, (300, 200))
+        self.assertEqual((post.image_width, post.image_height), (300, 200))
+
+    def test_transparency_is_kept(self):
+        if uploads.FORMAT == "JPEG":
+            self.skipTest("JPEG has no transparency")
+        _, stored = self.upload(Image.new("RGBA", (20, 20)), "PNG")
+        self.assertEqual(stored.mode, "RGBA")
+
+
 class CommentFormTest(TestFormsSetUpClassMixin, TestCase):
     @classmethod
     def tearDownClass(cls):
@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Luna")
+        cls.reader = User.objects.create(username="Neville")
+        cls.group = Group.objects.create(title="Ravenclaw",
+                                         description="Wit beyond measure",
+                                         slug="raven")
+        cls.post = Post.objects.create(text="Nargles took my shoes",
+                                       author=cls.author, group=cls.group)
+        cls.index = reverse("posts:index")
+        cls.group_page = reverse("posts:post_in_group",
+                                 kwargs={"slug": cls.group.slug})
+        cls.profile = reverse("posts:profile",
+                              kwargs={"username": cls.author.username})
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest = Client()
+
+    def assertServedFromCache(self, url):
+        self.guest.get(url)
+        with self.assertNumQueries(0):
+            response = self.guest.get(url)
+        self.assertIsNone(response.context)
+        self.assertIn("Cookie", response["Vary"])
+        return response
+
+    def assertRendered(self, url):
+        response = self.guest.get(url)
+        self.assertIsNotNone(response.context)
+        return response
+
+    def test_feed_pages_are_served_from_cache(self):
+        for url in (self.index, f"{self.index}?page=2", self.group_page,
+                    self.profile):
+            with self.subTest(url=url):
+                response = self.assertServedFromCache(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_new_post_replaces_cached_pages(self):
+        for url in (self.index, self.group_page, self.profile):
+            self.assertServedFromCache(url)
+        Post.objects.create(text="Wrackspurts", author=self.author,
+                            group=self.group)
+        for url in (self.index, self.group_page, self.profile):
+            with self.subTest(url=url):
+                self.assertContains(self.assertRendered(url), "Wrackspurts")
+
+    def test_comment_replaces_cached_pages(self):
+        self.assertServedFromCache(self.index)
+        Comment.objects.create(text="Loony", author=self.reader,
+                               post=self.post)
+        self.assertRendered(self.index)
+
+    def test_follow_replaces_cached_profiles(self):
+        reader_profile = reverse("posts:profile",
+                                 kwargs={"username": self.reader.username})
+        for url in (self.profile, reader_profile):
+            self.assertServedFromCache(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url in (self.profile, reader_profile):
+            with self.subTest(url=url):
+                self.assertRendered(url)
+
+    def test_logged_in_readers_bypass_cache(self):
+        self.assertServedFromCache(self.index)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(self.index)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, self.reader.username)
+        # nor is their page stored for anonymous readers
+        cache.clear()
+        client.get(self.index)
+        self.assertNotContains(self.assertRendered(self.index),
+                               self.reader.username)
+
+    def test_readers_with_csrf_cookie_bypass_cache(self):
+        self.assertServedFromCache(self.index)
+        self.guest.cookies[settings.CSRF_COOKIE_NAME] = "token"
+        self.assertRendered(self.index)
+
+    def test_other_pages_are_not_cached(self):
+        url = reverse("posts:post", kwargs={"username": self.author.username,
+                                            "post_id": self.post.pk})
+        self.guest.get(url)
+        self.assertRendered(url)
+
+    def test_every_hit_gets_a_response_of_its_own(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # the process tier hands the same object to every hit
+        caches = {
+            "default": {
+                "BACKEND": "yatube.cache_backends.tiered.TieredCache",
+                "LOCATION": "shared",
+            },
+            "shared": {
+                "BACKEND": "yatube.cache_backends.shared.SharedMemoryCache",
+                "LOCATION": os.path.join(directory.name, "cache"),
+            },
+        }
+        with override_settings(CACHES=caches):
+            self.guest.get(self.index)
+            first = self.guest.get(self.index)
+            second = self.guest.get(self.index)
+        self.assertIsNone(second.context)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(len(second._closable_objects), 1)
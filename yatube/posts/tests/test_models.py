@@ -1,7 +1,11 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
-from ..models import Post, Group, Comment, Follow
+from ..models import (COMMENT_MAX_DEPTH, Post, Group, Comment, Follow,
+                      UserStats)
 
 
 class PostGroupCommentModelTest(TestCase):
@@ -45,3 +49,131 @@ class PostGroupCommentModelTest(TestCase):
             with self.subTest(object=object):
                 self.assertEqual(expected_object_name, str(object),
                                  "Wrong name of object, check __str__ method")
+
+
+class CommentsCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User = get_user_model()
+        cls.author = User.objects.create(username="Luke")
+        cls.reader = User.objects.create(username="Leia")
+        cls.post = Post.objects.create(text="I am your father",
+                                       author=cls.author)
+
+    def comments_count(self):
+        return Post.objects.get(pk=self.post.pk).comments_count
+
+    def test_comment_create_and_delete_update_counter(self):
+        comment = Comment.objects.create(text="Noooo",
+                                         author=self.reader, post=self.post)
+        self.assertEqual(self.comments_count(), 1)
+        comment.delete()
+        self.assertEqual(self.comments_count(), 0)
+
+    def test_cascade_delete_updates_counter(self):
+        User = get_user_model()
+        vader = User.objects.create(username="Vader")
+        Comment.objects.create(text="Join me", author=vader, post=self.post)
+        Comment.objects.create(text="Why?", author=self.reader,
+                               post=self.post)
+        vader.delete()
+        self.assertEqual(self.comments_count(), 1)
+
+    def test_recount_comments_repairs_drift(self):
+        Comment.objects.create(text="Noooo", author=self.reader,
+                               post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=42)
+        call_command("recount_comments", chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.comments_count(), 1)
+
+
+class CommentThreadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User = get_user_model()
+        cls.author = User.objects.create(username="Han")
+        cls.post = Post.objects.create(text="I know", author=cls.author)
+
+    def reply(self, parent=None, text="..."):
+        return Comment.objects.create(text=text, author=self.author,
+                                      post=self.post, parent=parent)
+
+    def test_subtree_is_the_thread_in_reply_order(self):
+        root = self.reply(text="root")
+        first = self.reply(root, "first")
+        self.reply(first, "first.first")
+        self.reply(root, "second")
+        self.reply(text="another thread")
+        self.assertEqual(
+            [comment.text for comment in Comment.objects.subtree(root)],
+            ["root", "first", "first.first", "second"])
+        self.assertEqual(
+            [comment.text for comment in Comment.objects.subtree(first)],
+            ["first", "first.first"])
+        self.assertEqual(list(self.post.comments.threads()
+                              .values_list("text", flat=True)),
+                         ["another thread", "root"])
+
+    def test_replies_stop_at_the_deepest_level(self):
+        comment = self.reply()
+        for _ in range(COMMENT_MAX_DEPTH + 1):
+            comment = self.reply(comment)
+        comment = Comment.objects.get(pk=comment.pk)
+        self.assertEqual(comment.depth, COMMENT_MAX_DEPTH)
+        self.assertEqual(len(comment.ancestor_ids), COMMENT_MAX_DEPTH)
+        self.assertEqual(comment.parent.depth, COMMENT_MAX_DEPTH - 1)
+
+    def test_replies_count_follows_the_subtree(self):
+        root = self.reply()
+        answer = self.reply(root)
+        self.reply(self.reply(answer))
+        counts = dict(Comment.objects.values_list("pk", "replies_count"))
+        self.assertEqual(counts[root.pk], 3)
+        self.assertEqual(counts[answer.pk], 2)
+        answer.delete()
+        self.assertEqual(Comment.objects.get(pk=root.pk).replies_count, 0)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 1)
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User = get_user_model()
+        cls.author = User.objects.create(username="Han")
+        cls.reader = User.objects.create(username="Chewbacca")
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_stats_follow_posts_and_follows(self):
+        post = Post.objects.create(text="Never tell me the odds",
+                                   author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_rebuild_user_stats_repairs_drift(self):
+        Post.objects.create(text="I know", author=self.author)
+        UserStats.objects.filter(user=self.author).delete()
+        UserStats.objects.filter(user=self.reader).update(posts_count=7)
+        call_command("rebuild_user_stats", chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_deleting_user_updates_stats_of_others(self):
+        ackbar = get_user_model().objects.create(username="Ackbar")
+        Post.objects.create(text="It's a trap", author=ackbar)
+        Follow.objects.create(user=ackbar, author=self.author)
+        ackbar_pk = ackbar.pk
+        ackbar.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertFalse(UserStats.objects.filter(pk=ackbar_pk).exists())
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..feeds import INDEX_FEED, versioned
+from ..models import Post
+from ..paginators import FeedPaginator
+
+User = get_user_model()
+
+
+class FeedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="Filch")
+        Post.objects.create(text="Mrs Norris!", author=cls.user)
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def test_page_window_is_bounded(self):
+        paginator = FeedPaginator(range(10000), 10)
+        self.assertEqual(paginator.page_window(500),
+                         [1, None, 498, 499, 500, 501, 502, None, 1000])
+        self.assertEqual(paginator.page_window(1), [1, 2, 3, None, 1000])
+        self.assertEqual(FeedPaginator(range(30), 10).page_window(2),
+                         [1, 2, 3])
+
+    def test_count_is_cached_until_feed_changes(self):
+        def paginator():
+            return FeedPaginator(Post.objects.all(), 10,
+                                 count_key=f"{versioned(INDEX_FEED)}:count")
+
+        self.assertEqual(paginator().count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator().count, 1)
+        Post.objects.create(text="Students out of bed!", author=self.user)
+        self.assertEqual(paginator().count, 2)
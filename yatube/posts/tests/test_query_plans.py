@@ -0,0 +1,106 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import encode_cursor
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+TEMP_SORT = "USE TEMP B-TREE"
+# tables a view legitimately reads whole, e.g. choices of a form field
+FULL_SCAN_ALLOWED = {"posts_group"}
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite")
+class QueryPlanTest(TestCase):
+    """Every query of every view must use an index and need no sort."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Minerva")
+        cls.reader = User.objects.create(username="Seamus")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(title="Gryffindor",
+                                         description="Brave at heart",
+                                         slug="gryff")
+        cls.posts = [Post.objects.create(text=f"Transfiguration №{i}",
+                                         author=cls.author, group=cls.group)
+                     for i in range(12)]
+        cls.post = cls.posts[-1]
+        cls.comment = Comment.objects.create(text="Fire!", author=cls.reader,
+                                             post=cls.post)
+        Comment.objects.create(text="Aguamenti!", author=cls.author,
+                               post=cls.post, parent=cls.comment)
+
+    def setUp(self) -> None:
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def urls(self):
+        cursor = encode_cursor(self.posts[5])
+        username = self.author.username
+        post_kwargs = {"username": username, "post_id": self.post.pk}
+        feeds = [reverse("posts:index"),
+                 reverse("posts:post_in_group",
+                         kwargs={"slug": self.group.slug}),
+                 reverse("posts:profile", kwargs={"username": username}),
+                 reverse("posts:follow_index")]
+        for feed in feeds:
+            yield self.reader_client, feed
+            yield self.reader_client, f"{feed}?page=2"
+            yield self.reader_client, f"{feed}?after={cursor}"
+            yield self.reader_client, f"{feed}?before={cursor}"
+        yield self.reader_client, reverse("posts:post", kwargs=post_kwargs)
+        search = reverse("posts:search")
+        yield self.reader_client, f"{search}?q=transfiguration"
+        page = self.reader_client.get(search, {"q": "transfiguration"})
+        yield self.reader_client, (f"{search}?q=transfiguration&after="
+                                   f"{page.context['page'].next_cursor}")
+        comment_cursor = encode_cursor(self.comment, "created")
+        yield self.reader_client, (reverse("posts:post_comments",
+                                           kwargs=post_kwargs)
+                                   + f"?after={comment_cursor}")
+        yield self.reader_client, reverse("posts:comment_thread",
+                                          kwargs={**post_kwargs,
+                                                  "comment_id":
+                                                  self.comment.pk})
+        yield self.reader_client, reverse("posts:add_comment",
+                                          kwargs=post_kwargs)
+        yield self.reader_client, reverse("posts:new_post")
+        yield self.author_client, reverse("posts:post_edit",
+                                          kwargs=post_kwargs)
+        yield self.reader_client, reverse("posts:profile_unfollow",
+                                          kwargs={"username": username})
+        yield self.reader_client, reverse("posts:profile_follow",
+                                          kwargs={"username": username})
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_view_queries_use_indexes(self):
+        for client, url in self.urls():
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            for query in queries.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+                for step in self.query_plan(sql):
+                    with self.subTest(url=url, sql=sql, step=step):
+                        self.assertNotIn(TEMP_SORT, step)
+                        full_scan = FULL_SCAN.match(step)
+                        if full_scan:
+                            self.assertIn(full_scan.group(1),
+                                          FULL_SCAN_ALLOWED)
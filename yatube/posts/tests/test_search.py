@@ -0,0 +1,103 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 is SQLite")
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Hermione")
+        cls.post = Post.objects.create(
+            text="Лумос зажигает свет на конце палочки", author=cls.author)
+        Post.objects.create(text="Нокс гасит свет", author=cls.author)
+        cls.url = reverse("posts:search")
+
+    def found(self, query, **params):
+        response = self.client.get(self.url, {"q": query, **params})
+        return [post.pk for post in response.context["page"]]
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.found("лумос"), [self.post.pk])
+        Post.objects.filter(pk=self.post.pk).update(text="Экспеллиармус")
+        self.assertEqual(self.found("лумос"), [])
+        self.assertEqual(self.found("экспелл"), [self.post.pk])
+        post = Post.objects.create(text="Лумос максима", author=self.author)
+        self.assertEqual(self.found("ЛУМОС"), [post.pk])
+        post.delete()
+        self.assertEqual(self.found("лумос"), [])
+
+    def test_best_match_comes_first(self):
+        Post.objects.create(text="Свет, свет и ещё раз свет",
+                            author=self.author)
+        results = self.client.get(self.url, {"q": "свет"}).context["page"]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0].text, "Свет, свет и ещё раз свет")
+
+    def test_matches_are_highlighted_and_escaped(self):
+        Post.objects.create(text="<b>Алохомора</b> открывает замки",
+                            author=self.author)
+        response = self.client.get(self.url, {"q": "алохомора"})
+        self.assertContains(response, "&lt;b&gt;<mark>Алохомора</mark>")
+
+    def test_query_syntax_cannot_break_search(self):
+        for query in ('"', 'свет AND (', "NEAR(", "*", "-свет"):
+            with self.subTest(query=query):
+                response = self.client.get(self.url, {"q": query})
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGINATOR_PAGE_NUM=4)
+    def test_cursor_pages_cover_all_matches(self):
+        posts = [Post.objects.create(text=f"Свет №{i}", author=self.author)
+                 for i in range(9)]
+        page = self.client.get(self.url, {"q": "свет"}).context["page"]
+        found = [post.pk for post in page]
+        while page.has_next():
+            page = self.client.get(self.url, {
+                "q": "свет", "after": page.next_cursor}).context["page"]
+            found += [post.pk for post in page]
+        self.assertEqual(len(found), len(posts) + 2)
+        self.assertEqual(len(set(found)), len(found))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser("Minerva", "m@hogwarts.uk",
+                                              "pass")
+        client = Client()
+        client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("admin:posts_post_changelist"),
+                                  {"q": "палочки"})
+        self.assertEqual(list(response.context["cl"].result_list),
+                         [self.post])
+        self.assertFalse(any("LIKE" in query["sql"]
+                             for query in queries.captured_queries))
+
+    def test_rebuild_repairs_drift(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE}")
+            cursor.execute(f"INSERT INTO {search.TABLE}(rowid, text) "
+                           "VALUES (100500, 'лумос')")
+        out = StringIO()
+        call_command("rebuild_search_index", chunk_size=1, stdout=out)
+        self.assertIn("Indexed 2 posts", out.getvalue())
+        self.assertEqual(self.found("лумос"), [self.post.pk])
+
+    def test_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.TABLE}_insert")
+        search.install_triggers()
+        post = Post.objects.create(text="Репаро", author=self.author)
+        self.assertEqual(self.found("репаро"), [post.pk])
@@ -0,0 +1,196 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CARD = "posts/includes/post_card.html"
+# rendered only when the card itself is
+IMAGE = "posts/includes/post_image.html"
+
+
+class PageShellTest(TestCase):
+    """Feed markup is shared by all users, the holes are filled per user."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Fred")
+        cls.reader = User.objects.create(username="George")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text="Mischief managed",
+                                       author=cls.author)
+        cls.index = reverse("posts:index")
+        cls.profile = reverse("posts:profile",
+                              kwargs={"username": cls.author.username})
+        cls.post_page = reverse("posts:post",
+                                kwargs={"username": cls.author.username,
+                                        "post_id": cls.post.pk})
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_shell_is_rendered_once(self):
+        self.author_client.get(self.index)
+        response = self.reader_client.get(self.index)
+        self.assertTemplateNotUsed(response, CARD)
+        self.assertTemplateUsed(response, "posts/includes/post_actions.html")
+        self.assertContains(response, "Mischief managed")
+
+    def test_post_buttons_depend_on_user(self):
+        edit = reverse("posts:post_edit",
+                       kwargs={"username": self.author.username,
+                               "post_id": self.post.pk})
+        for url in (self.index, self.profile):
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertContains(response, edit)
+                self.assertContains(response, "Добавить комментарий")
+                response = self.reader_client.get(url)
+                self.assertNotContains(response, edit)
+                self.assertContains(response, "Добавить комментарий")
+                response = Client().get(url)
+                self.assertNotContains(response, "Добавить комментарий")
+
+    def test_follow_button_depends_on_user(self):
+        unfollow = reverse("posts:profile_unfollow",
+                           kwargs={"username": self.author.username})
+        self.assertNotContains(self.author_client.get(self.profile), unfollow)
+        self.assertContains(self.reader_client.get(self.profile), unfollow)
+        stranger = User.objects.create(username="Percy")
+        client = Client()
+        client.force_login(stranger)
+        response = client.get(self.profile)
+        self.assertTemplateNotUsed(response, CARD)
+        self.assertNotContains(response, unfollow)
+        self.assertContains(response, "Подписаться")
+
+    def test_comment_form_is_not_shared(self):
+        self.assertContains(self.reader_client.get(self.post_page),
+                            "csrfmiddlewaretoken")
+        response = Client().get(self.post_page)
+        self.assertTemplateNotUsed(response, CARD)
+        self.assertNotContains(response, "csrfmiddlewaretoken")
+
+    def test_shell_follows_writes(self):
+        self.reader_client.get(self.index)
+        Post.objects.create(text="Weasleys' Wizard Wheezes",
+                            author=self.author)
+        self.assertContains(self.reader_client.get(self.index),
+                            "Weasleys&#39; Wizard Wheezes")
+
+
+class PostCardCacheTest(TestCase):
+    """Cards are rendered again only when their post version changes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Oliver")
+        cls.group = Group.objects.create(title="Quidditch",
+                                         description="Keepers",
+                                         slug="quidditch")
+        cls.post = Post.objects.create(text="Seeker wanted",
+                                       author=cls.author, group=cls.group)
+        cls.index = reverse("posts:index")
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def rendered_cards(self, url=None):
+        response = self.client.get(url or self.index)
+        return [template.name for template in response.templates].count(IMAGE)
+
+    def test_new_post_renders_only_its_card(self):
+        self.assertEqual(self.rendered_cards(), 1)
+        Post.objects.create(text="Beater wanted", author=self.author)
+        self.assertEqual(self.rendered_cards(), 1)
+        self.assertEqual(self.rendered_cards(), 0)
+
+    def test_card_follows_its_post(self):
+        self.rendered_cards()
+        changes = {
+            "edit": lambda: Post.objects.get(pk=self.post.pk).save(),
+            "comment": lambda: Comment.objects.create(
+                text="Me!", author=self.author, post=self.post),
+            "group": lambda: Group.objects.filter(pk=self.group.pk).get()
+            .save(),
+        }
+        for change, apply in changes.items():
+            with self.subTest(change=change):
+                apply()
+                self.assertEqual(self.rendered_cards(), 1)
+
+    def test_group_rename_reaches_profile_cards(self):
+        profile = reverse("posts:profile",
+                          kwargs={"username": self.author.username})
+        self.rendered_cards(profile)
+        self.group.title = "Gobstones"
+        self.group.save()
+        self.assertContains(self.client.get(profile), "#Gobstones")
+
+    def test_group_rename_reaches_follow_cards(self):
+        reader = Client()
+        reader.force_login(User.objects.create(username="Percy"))
+        reader.get(reverse("posts:profile_follow",
+                           kwargs={"username": self.author.username}))
+        follow = reverse("posts:follow_index")
+        self.assertContains(reader.get(follow), "#Quidditch")
+        self.group.title = "Gobstones"
+        self.group.save()
+        self.assertContains(reader.get(follow), "#Gobstones")
+
+    def test_cached_card_keeps_holes_of_each_user(self):
+        edit = reverse("posts:post_edit",
+                       kwargs={"username": self.author.username,
+                               "post_id": self.post.pk})
+        profile = reverse("posts:profile",
+                          kwargs={"username": self.author.username})
+        self.assertContains(self.client.get(profile), edit)
+        reader = Client()
+        reader.force_login(User.objects.create(username="Katie"))
+        response = reader.get(self.index)
+        self.assertTemplateNotUsed(response, IMAGE)
+        self.assertNotContains(response, edit)
+        self.assertContains(self.client.get(self.index), edit)
+
+    def test_render_benchmark(self):
+        out = StringIO()
+        call_command("bench_feed_render", iterations=1, stdout=out)
+        for scenario in ("cold", "warm cards", "warm"):
+            self.assertIn(f"{scenario} ", out.getvalue())
+
+
+class ShellTagsTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def render(self, source, **context):
+        template = Template("{% load shell %}" + source)
+        return template.render(Context(context))
+
+    def test_hole_outside_shell_is_rendered_in_place(self):
+        self.assertIn("Избранные авторы", self.render(
+            '{% hole "posts/includes/menu.html" follow=True %}',
+            user=User(username="Ginny")))
+
+    def test_shell_without_key_is_not_cached(self):
+        source = '{% shell key "content" %}{{ value }}{% endshell %}'
+        self.assertEqual(self.render(source, key=None, value=1), "1")
+        self.assertEqual(self.render(source, key=None, value=2), "2")
+        self.assertEqual(self.render(source, key="k", value=1), "1")
+        self.assertEqual(self.render(source, key="k", value=2), "1")
@@ -0,0 +1,218 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Follow, Post
+from ..thumbnails import HEIGHT, WIDTH, make_thumbnails, variants
+from ..timeline import fan_out_post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name="photo.png", size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=(200, 30, 30)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type="image/png")
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Colin")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def post(self):
+        return Post.objects.latest("pk")
+
+    def test_new_post_gets_thumbnail(self):
+        self.client.post(reverse("posts:new_post"),
+                         {"text": "Harry!", "image": image_file()})
+        post = self.post()
+        self.assertEqual([(thumbnail["type"], thumbnail["width"],
+                           thumbnail["height"])
+                          for thumbnail in post.renditions], variants())
+        for thumbnail in post.renditions:
+            path = thumbnail["url"][len(settings.MEDIA_URL):]
+            with Image.open(f"{TEMP_MEDIA_ROOT}/{path}") as image:
+                self.assertEqual(image.get_format_mimetype(),
+                                 thumbnail["type"])
+                self.assertEqual(image.size,
+                                 (thumbnail["width"], thumbnail["height"]))
+        response = self.client.get(reverse("posts:index"))
+        for thumbnail in post.renditions:
+            self.assertContains(response,
+                                f"{thumbnail['url']} {thumbnail['width']}w")
+        self.assertContains(
+            response, f'width="{WIDTH}" height="{HEIGHT}"')
+
+    def test_only_first_card_loads_lazily(self):
+        for text in ("First", "Second", "Third"):
+            Post.objects.create(text=text, author=self.author,
+                                image=image_file())
+        index = self.client.get(reverse("posts:index")).content.decode()
+        self.assertEqual(index.count("<img"), 3)
+        self.assertEqual(index.count('loading="lazy"'), 2)
+        post = self.client.get(reverse(
+            "posts:post", kwargs={"username": self.author.username,
+                                  "post_id": self.post().pk}))
+        self.assertNotContains(post, 'loading="lazy"')
+
+    def test_cached_card_loads_lazily_below_first_place(self):
+        first = Post.objects.create(text="First", author=self.author,
+                                    image=image_file())
+        index = self.client.get(reverse("posts:index")).content.decode()
+        self.assertNotIn('loading="lazy"', index)
+        Post.objects.create(text="Second", author=self.author,
+                            image=image_file())
+        index = self.client.get(reverse("posts:index")).content.decode()
+        self.assertEqual(index.count('loading="lazy"'), 1)
+        self.assertLess(index.index("Second"), index.index('loading="lazy"'))
+        self.assertLess(index.index('loading="lazy"'), index.index("First"))
+        first.delete()
+        index = self.client.get(reverse("posts:index")).content.decode()
+        self.assertNotIn('loading="lazy"', index)
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        with mock.patch("posts.signals.tasks.run") as run:
+            post = Post.objects.create(text="Camera", author=self.author,
+                                       image=image_file())
+        run.assert_any_call(make_thumbnails, post.pk, queue="images")
+        with mock.patch("PIL.Image.open") as image_open:
+            response = self.client.get(reverse("posts:index"))
+        image_open.assert_not_called()
+        self.assertContains(response, "aspect-ratio: 960 / 339")
+        self.assertNotContains(response, "<img")
+
+    def test_thumbnail_reaches_follow_feed(self):
+        reader = User.objects.create(username="Dennis")
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        with mock.patch("posts.signals.tasks.run"):
+            post = Post.objects.create(text="Camera", author=self.author,
+                                       image=image_file())
+        fan_out_post(post.pk)
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertContains(response, "aspect-ratio: 960 / 339")
+        make_thumbnails(post.pk)
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertContains(response, "<img")
+
+    def test_new_image_replaces_thumbnail(self):
+        post = Post.objects.create(text="Camera", author=self.author,
+                                   image=image_file())
+        old = self.post().renditions
+        self.client.post(
+            reverse("posts:post_edit",
+                    kwargs={"username": self.author.username,
+                            "post_id": post.pk}),
+            {"text": "New camera", "image": image_file("other.png")})
+        new = self.post().renditions
+        self.assertTrue(new)
+        self.assertNotEqual(new, old)
+
+    def test_text_edit_keeps_thumbnail(self):
+        Post.objects.create(text="Camera", author=self.author,
+                            image=image_file())
+        post = self.post()
+        renditions = post.renditions
+        with mock.patch("posts.thumbnails.make_thumbnails") as make:
+            post.text = "Still a camera"
+            post.save()
+        make.assert_not_called()
+        self.assertEqual(self.post().renditions, renditions)
+
+    def test_broken_image_keeps_placeholder(self):
+        broken = SimpleUploadedFile("broken.png", b"not an image",
+                                    content_type="image/png")
+        with self.assertLogs("posts.thumbnails", "WARNING"):
+            Post.objects.create(text="Oops", author=self.author,
+                                image=broken)
+        self.assertEqual(self.post().renditions, [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Colin")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        # the posts are saved before any thumbnail is made
+        with mock.patch("posts.signals.tasks.run"):
+            for i in range(3):
+                Post.objects.create(text=f"Camera {i}", author=self.author,
+                                    image=image_file(f"photo{i}.png"))
+        Post.objects.create(text="No camera", author=self.author)
+
+    def warm(self, workers=1) -> str:
+        out = io.StringIO()
+        call_command("warm_thumbnails", chunk_size=2, workers=workers,
+                     stdout=out)
+        return out.getvalue()
+
+    def test_every_image_gets_thumbnail(self):
+        output = self.warm(workers=2)
+        self.assertIn("Made thumbnails of 3 of 3 posts", output)
+        for post in Post.objects.exclude(image=""):
+            self.assertEqual(len(post.renditions), len(variants()))
+
+    def test_second_run_skips_ready_thumbnails(self):
+        self.warm()
+        with mock.patch("posts.thumbnails._render") as render:
+            output = self.warm()
+        render.assert_not_called()
+        self.assertIn("Made thumbnails of 0 of 3 posts", output)
+
+    def test_new_size_is_made_again(self):
+        self.warm()
+        with mock.patch("posts.thumbnails.WIDTHS", (360, WIDTH)):
+            output = self.warm()
+            post = Post.objects.exclude(image="").first()
+            self.assertEqual(post.renditions[0]["width"], 360)
+        self.assertIn("Made thumbnails of 3 of", output)
+
+    def test_follow_feed_shows_thumbnails(self):
+        cache.clear()
+        reader = User.objects.create(username="Dennis")
+        Follow.objects.create(user=reader, author=self.author)
+        for post in Post.objects.all():
+            fan_out_post(post.pk)
+        client = Client()
+        client.force_login(reader)
+        response = client.get(reverse("posts:follow_index"))
+        self.assertNotContains(response, "<img")
+        self.warm()
+        response = client.get(reverse("posts:follow_index"))
+        self.assertContains(response, "<img", count=3)
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import tasks, timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    """Checking fan-out of posts into follower timelines."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Dumbledore")
+        cls.reader = User.objects.create(username="Neville")
+
+    def setUp(self) -> None:
+        self.client.force_login(self.reader)
+
+    def timeline_posts(self):
+        return set(TimelineEntry.objects.filter(user=self.reader)
+                   .values_list("post_id", flat=True))
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="Happiness can be found",
+                                   author=self.author)
+        self.assertEqual(self.timeline_posts(), {post.pk})
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        post = Post.objects.create(text="Even in the darkest of times",
+                                   author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), {post.pk})
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), set())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="If one only remembers",
+                                   author=self.author)
+        self.assertEqual(self.timeline_posts(), set())
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertIn(post, response.context["page"].object_list)
+
+    def rebuild(self, *args) -> str:
+        out = StringIO()
+        call_command("rebuild_timelines", *args, chunk_size=1, stdout=out)
+        return out.getvalue()
+
+    def test_rebuild_delivers_lost_posts_and_drops_unfollowed(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        # the fan-out is lost, as with a worker restart
+        with mock.patch("posts.timeline.fan_out_post"):
+            post = Post.objects.create(text="It is our choices",
+                                       author=self.author)
+        other = User.objects.create(username="Grindelwald")
+        stale = Post.objects.create(text="For the greater good",
+                                    author=other)
+        TimelineEntry.objects.create(user=self.reader, post=stale,
+                                     pub_date=stale.pub_date)
+        self.assertEqual(self.timeline_posts(), {stale.pk})
+        output = self.rebuild()
+        self.assertEqual(self.timeline_posts(), {post.pk})
+        self.assertIn("1 entries added, 1 removed", output)
+        self.assertIn("0 entries added, 0 removed", self.rebuild())
+
+    def test_rebuild_of_recent_posts_only(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch("posts.timeline.fan_out_post"):
+            old = Post.objects.create(text="Old", author=self.author)
+            new = Post.objects.create(text="New", author=self.author)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=old.pub_date - timedelta(days=30))
+        self.rebuild("--days", "7")
+        self.assertEqual(self.timeline_posts(), {new.pk})
+
+
+class CoalescedTasksTest(TestCase):
+
+    @override_settings(POSTS_TASKS_EAGER=False)
+    def test_waiting_task_is_not_queued_again(self):
+        self.addCleanup(tasks._waiting.clear)
+        with mock.patch("posts.tasks._executor") as executor:
+            for _ in range(3):
+                tasks.run(timeline.refresh_followers, 1, queue="feeds",
+                          coalesce=True)
+            tasks.run(timeline.refresh_followers, 2, queue="feeds",
+                      coalesce=True)
+        submit = executor.return_value.submit
+        self.assertEqual(submit.call_count, 2)
+        # once started, the next change queues it again
+        tasks._execute(*submit.call_args_list[0][0][1:])
+        with mock.patch("posts.tasks._executor") as executor:
+            tasks.run(timeline.refresh_followers, 1, queue="feeds",
+                      coalesce=True)
+        executor.return_value.submit.assert_called_once()
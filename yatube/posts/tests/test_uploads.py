@@ -0,0 +1,144 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import uploads
+from ..models import Follow, Post
+from ..thumbnails import thumbnail_names
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_bytes(color=(200, 30, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color=color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StoredImagesTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Neville")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, name="toad.png", content=None) -> Post:
+        image = SimpleUploadedFile(name, content or image_bytes())
+        return Post.objects.create(text="Trevor", author=self.author,
+                                   image=image)
+
+    def test_shared_image_is_deleted_with_last_post(self):
+        first = self.create()
+        second = Post.objects.create(text="Trevor again", author=self.author,
+                                     image=first.image.name)
+        name = first.image.name
+        thumbnail = thumbnail_names(name)[0]
+        self.assertTrue(default_storage.exists(thumbnail))
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail))
+
+    def test_image_is_deleted_after_commit(self):
+        post = self.create()
+        committed = []
+        with mock.patch("django.db.transaction.on_commit",
+                        committed.append):
+            post.delete()
+        self.assertTrue(default_storage.exists(post.image.name))
+        for callback in committed:
+            callback()
+        self.assertFalse(default_storage.exists(post.image.name))
+
+    def test_image_shared_while_released_is_stored_again(self):
+        post = self.create()
+        name = post.image.name
+        shared = []
+
+        def share(image_name):
+            # a post sharing the image commits during the release
+            shared.append(Post.objects.create(text="Trevor again",
+                                              author=self.author,
+                                              image=name))
+            return thumbnail_names(image_name)
+
+        with mock.patch.object(uploads, "thumbnail_names", share):
+            post.delete()
+        self.assertTrue(shared)
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(all(default_storage.exists(thumbnail)
+                            for thumbnail in thumbnail_names(name)))
+
+    def test_replaced_image_is_deleted(self):
+        post = self.create()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile("frog.png", image_bytes((0, 0, 0)))
+        post.save()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def dedupe(self, *args) -> str:
+        out = io.StringIO()
+        call_command("dedupe_images", *args, chunk_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_copies_are_folded_into_first_file(self):
+        posts = [self.create() for _ in range(3)]
+        other = self.create("frog.png", image_bytes((0, 0, 0)))
+        names = [post.image.name for post in posts]
+        self.assertEqual(len(set(names)), 3)
+        output = self.dedupe()
+        self.assertIn("found 2 copies", output)
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, names[0])
+            self.assertTrue(post.renditions)
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, "posts/frog.png")
+        self.assertTrue(default_storage.exists(names[0]))
+        for name in names[1:]:
+            self.assertFalse(default_storage.exists(name))
+            self.assertFalse(default_storage.exists(thumbnail_names(name)[0]))
+        self.assertIn("found 0 copies", self.dedupe())
+
+    def test_follow_feeds_show_kept_file(self):
+        cache.clear()
+        reader = User.objects.create(username="Seamus")
+        Follow.objects.create(user=reader, author=self.author)
+        self.create()
+        copy = Post.objects.get(pk=self.create().pk)
+        thumbnail = copy.renditions[0]["url"]
+        client = Client()
+        client.force_login(reader)
+        self.assertContains(client.get(reverse("posts:follow_index")),
+                            thumbnail)
+        self.dedupe()
+        self.assertNotContains(client.get(reverse("posts:follow_index")),
+                               thumbnail)
+
+    def test_dry_run_changes_nothing(self):
+        names = [self.create().image.name for _ in range(2)]
+        self.assertIn("found 1 copies. Would free", self.dedupe("--dry-run"))
+        self.assertCountEqual(Post.objects.values_list("image", flat=True),
+                              names)
+        self.assertTrue(all(default_storage.exists(name) for name in names))
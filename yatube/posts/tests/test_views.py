@@ -1,14 +1,19 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django import forms
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from ..feeds import INDEX_FEED, versioned
 from ..models import Post, Group, Follow, Comment
 
 User = get_user_model()
@@ -118,17 +123,24 @@ class PostPagesTest(TestViewsSetUpClassMixin, TestCase):
         self.assertEqual(post_object.image, f"posts/{self.test_image}")
 
     def test_homepage_uses_the_cache(self):
+        # first request
+        self.authorized_user.get(reverse("posts:index"))
+        # second request
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_user.get(reverse("posts:index"))
+        self.assertEqual(len(response.context["page"].object_list), 1)
+        self.assertFalse([query for query in queries.captured_queries
+                          if "posts_post" in query["sql"]])
+
+    def test_homepage_shows_writes_immediately(self):
         second_post = Post.objects.create(text="Obliviate",
                                           author=self.user,
                                           image=self.test_image)
         # first request
-        self.authorized_user.get(reverse("posts:index"))
-        second_post.delete()
-        # second request
         response = self.authorized_user.get(reverse("posts:index"))
         self.assertEqual(len(response.context["page"].object_list), 2)
-        cache.clear()
-        # third request
+        second_post.delete()
+        # second request
         response = self.authorized_user.get(reverse("posts:index"))
         self.assertEqual(len(response.context["page"].object_list), 1)
 
@@ -185,7 +197,7 @@ class PostPagesTest(TestViewsSetUpClassMixin, TestCase):
         )
         post_object = response.context["post"]
         author = response.context["author"]
-        comment = response.context["comments"].first()
+        comment = response.context["comments"][0]
         self.assertEqual(post_object.text, "Avada Kedavra")
         self.assertEqual(post_object.image, f"posts/{self.test_image}")
         self.assertEqual(author.username, "DracoMalfoy")
@@ -228,7 +240,6 @@ class PaginatorViewsTest(TestCase):
         super().setUpClass()
         cls.user = User.objects.create(username="Harry Potter")
         cls.follow_user = User.objects.create(username="Severus Snape")
-        Follow.objects.create(user=cls.follow_user, author=cls.user)
         cls.group = Group.objects.create(
             title="Grifindor",
             description="We like Lions",
@@ -252,6 +263,8 @@ class PaginatorViewsTest(TestCase):
                   group=cls.group, image=cls.test_image)
              for i in range(1, 14)]
         )
+        # bulk_create skips fan-out, following afterwards backfills
+        Follow.objects.create(user=cls.follow_user, author=cls.user)
 
     def tearDown(self) -> None:
         cache.clear()
@@ -296,6 +309,45 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response.context['page'].object_list), number)
 
+    def test_feed_cache_stores_only_requested_page(self):
+        self.guest_user.get(reverse("posts:index") + "?page=2")
+        prefix = versioned(INDEX_FEED)
+        (count, number, object_list), _, _ = cache.get(f"{prefix}:2")
+        self.assertEqual(count, 13)
+        self.assertEqual(number, 2)
+        self.assertEqual(len(object_list), 3)
+        self.assertIsNone(cache.get(f"{prefix}:1"))
+
+    def test_cursor_pages_follow_and_return(self):
+        reverse_name = reverse("posts:index")
+        first_page = self.guest_user.get(reverse_name).context["page"]
+        response = self.guest_user.get(
+            reverse_name, {"after": first_page.next_cursor})
+        next_page = response.context["page"]
+        self.assertEqual(len(next_page.object_list), 3)
+        self.assertFalse(next_page.has_next())
+        self.assertEqual(next_page.object_list[0].pk, 3)
+        response = self.guest_user.get(
+            reverse_name, {"before": next_page.previous_cursor})
+        previous_page = response.context["page"]
+        self.assertEqual(list(previous_page.object_list),
+                         list(first_page.object_list))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.guest_user.get(reverse("posts:index"),
+                                       {"after": "not-a-cursor"})
+        self.assertEqual(response.context["page"].number, 1)
+
+    def test_follow_page_cursor(self):
+        authorized_user = Client()
+        authorized_user.force_login(self.follow_user)
+        reverse_name = reverse("posts:follow_index")
+        first_page = authorized_user.get(reverse_name).context["page"]
+        response = authorized_user.get(
+            reverse_name, {"after": first_page.next_cursor})
+        self.assertEqual(len(response.context["page"].object_list), 3)
+
     def test_profile_follow_page_contains_ten_and_three_records(self):
         authorized_user = Client()
         authorized_user.force_login(self.follow_user)
@@ -411,3 +463,290 @@ class CreateFollowTest(TestViewsSetUpClassMixin, TestCase):
         self.assertEqual(self.user.following.count(), count_followers - 1)
         self.assertFalse(
             self.user.following.filter(user=self.follow_user1).exists())
+
+
+class FeedQueriesTest(TestCase):
+    """Feed pages run a fixed number of queries whatever the page holds."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="Hermione")
+        cls.reader = User.objects.create(username="Ron")
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.group = Group.objects.create(
+            title="Ravenclaw",
+            description="Wit beyond measure",
+            slug="raven"
+        )
+        for i in range(12):
+            post = Post.objects.create(text=f"Spell №{i}",
+                                       author=cls.user,
+                                       group=cls.group)
+            Comment.objects.create(text="Wingardium Leviosa",
+                                   post=post, author=cls.reader)
+
+    def setUp(self) -> None:
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def test_feed_pages_use_fixed_number_of_queries(self):
+        # session and user lookups, the ETag lookup, then the feed queries
+        feeds_queries = {
+            reverse("posts:index"): 4,
+            reverse("posts:post_in_group",
+                    kwargs={"slug": self.group.slug}): 6,
+            reverse("posts:profile",
+                    kwargs={"username": self.user.username}): 7,
+            reverse("posts:follow_index"): 5,
+        }
+        for url, queries in feeds_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.reader_client.get(url)
+                self.assertContains(response, "Комментариев: 1")
+
+
+class ConditionalGetTest(TestCase):
+    """Unchanged pages are answered with 304 without rendering."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Remus")
+        cls.reader = User.objects.create(username="Tonks")
+        cls.group = Group.objects.create(title="Order of the Phoenix",
+                                         description="Dumbledore's army",
+                                         slug="order")
+        cls.post = Post.objects.create(text="Moony was here",
+                                       author=cls.author, group=cls.group)
+        cls.post_url = reverse("posts:post",
+                               kwargs={"username": cls.author.username,
+                                       "post_id": cls.post.pk})
+        cls.urls = [reverse("posts:index"),
+                    reverse("posts:post_in_group",
+                            kwargs={"slug": cls.group.slug}),
+                    reverse("posts:profile",
+                            kwargs={"username": cls.author.username}),
+                    cls.post_url]
+
+    def setUp(self) -> None:
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)["ETag"]
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_writes_change_validators(self):
+        writes = {
+            "post": lambda: Post.objects.create(text="Padfoot",
+                                                author=self.author,
+                                                group=self.group),
+            "comment": lambda: Comment.objects.create(
+                text="Wotcher", author=self.reader, post=self.post),
+            "edit": lambda: Post.objects.get(pk=self.post.pk).save(),
+        }
+        for write, apply in writes.items():
+            for url in self.urls:
+                with self.subTest(write=write, url=url):
+                    etag = self.client.get(url)["ETag"]
+                    apply()
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_validators_depend_on_user(self):
+        author_client = Client()
+        author_client.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(author_client.get(url)["ETag"],
+                                    self.client.get(url)["ETag"])
+
+    def test_cached_anonymous_page_is_not_modified(self):
+        url = reverse("posts:index")
+        guest = Client()
+        etag = guest.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_pages_are_not_found(self):
+        urls = [reverse("posts:post_in_group", kwargs={"slug": "nope"}),
+                reverse("posts:profile", kwargs={"username": "nobody"}),
+                reverse("posts:post", kwargs={"username": "Remus",
+                                              "post_id": 404})]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(COMMENTS_PAGE_NUM=5)
+class CommentPagesTest(TestCase):
+    """Post pages show the newest comments and load the rest by cursor."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Sybill")
+        cls.reader = User.objects.create(username="Parvati")
+        cls.post = Post.objects.create(text="The Grim!", author=cls.author)
+        cls.quiet_post = Post.objects.create(text="Nothing to see",
+                                             author=cls.author)
+        cls.comments = [Comment.objects.create(text=f"Prophecy №{i}",
+                                               author=cls.reader,
+                                               post=cls.post)
+                        for i in range(12)]
+        cls.quiet_comment = Comment.objects.create(text="Hmm",
+                                                   author=cls.reader,
+                                                   post=cls.quiet_post)
+        kwargs = {"username": cls.author.username, "post_id": cls.post.pk}
+        cls.url = reverse("posts:post", kwargs=kwargs)
+        cls.fragment_url = reverse("posts:post_comments", kwargs=kwargs)
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_post_page_shows_newest_comments(self):
+        comments = self.client.get(self.url).context["comments"]
+        self.assertEqual(self.texts(comments),
+                         [f"Prophecy №{i}" for i in range(11, 6, -1)])
+        self.assertTrue(comments.has_next())
+
+    def test_fragments_load_remaining_comments(self):
+        comments = self.client.get(self.url).context["comments"]
+        loaded = self.texts(comments)
+        while comments.has_next():
+            response = self.client.get(self.fragment_url,
+                                       {"after": comments.next_cursor})
+            self.assertTemplateNotUsed(response, "base.html")
+            comments = response.context["comments"]
+            loaded += self.texts(comments)
+        self.assertEqual(loaded, self.texts(reversed(self.comments)))
+        self.assertNotContains(response, "comments-more")
+
+    def test_post_page_costs_the_same_for_any_number_of_comments(self):
+        quiet_url = reverse("posts:post",
+                            kwargs={"username": self.author.username,
+                                    "post_id": self.quiet_post.pk})
+        with CaptureQueriesContext(connection) as quiet:
+            self.client.get(quiet_url)
+        cache.clear()
+        with self.assertNumQueries(len(quiet.captured_queries)):
+            self.client.get(self.url)
+
+    def test_post_page_costs_the_same_for_any_number_of_threads(self):
+        for parent in [self.quiet_comment, *self.comments]:
+            Comment.objects.create(text="Indeed", author=self.author,
+                                   post=parent.post, parent=parent)
+        quiet_url = reverse("posts:post",
+                            kwargs={"username": self.author.username,
+                                    "post_id": self.quiet_post.pk})
+        with CaptureQueriesContext(connection) as quiet:
+            self.client.get(quiet_url)
+        cache.clear()
+        with self.assertNumQueries(len(quiet.captured_queries)):
+            response = self.client.get(self.url)
+        for comment in response.context["comments"]:
+            self.assertEqual(self.texts(comment.preview_replies), ["Indeed"])
+
+    def test_fragment_of_missing_post_is_not_found(self):
+        url = reverse("posts:post_comments",
+                      kwargs={"username": self.reader.username,
+                              "post_id": self.post.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(COMMENT_REPLIES_PREVIEW=2)
+class CommentThreadsTest(TestCase):
+    """Replies come under their thread; a whole thread is one query."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="Remus")
+        cls.reader = User.objects.create(username="Nymphadora")
+        cls.post = Post.objects.create(text="Full moon", author=cls.author)
+        cls.root = Comment.objects.create(text="Stay inside",
+                                          author=cls.reader, post=cls.post)
+        parent = cls.root
+        for i in range(10):
+            parent = Comment.objects.create(text=f"Answer №{i}",
+                                            author=cls.author,
+                                            post=cls.post, parent=parent)
+        kwargs = {"username": cls.author.username, "post_id": cls.post.pk}
+        cls.url = reverse("posts:post", kwargs=kwargs)
+        cls.add_url = reverse("posts:add_comment", kwargs=kwargs)
+        cls.thread_url = reverse("posts:comment_thread",
+                                 kwargs={**kwargs, "comment_id": cls.root.pk})
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_page_previews_first_replies(self):
+        response = self.client.get(self.url)
+        root = response.context["comments"][0]
+        self.assertEqual([reply.text for reply in root.preview_replies],
+                         ["Answer №0", "Answer №1"])
+        self.assertContains(response, self.thread_url)
+
+    def test_thread_fragment_reads_whole_thread_in_one_query(self):
+        # one query finds the comment, one reads its thread
+        with self.assertNumQueries(2):
+            response = self.client.get(self.thread_url)
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual([comment.text for comment in
+                          response.context["thread"]],
+                         ["Stay inside", *(f"Answer №{i}" for i in range(10))])
+
+    def test_reply_is_added_to_thread(self):
+        self.reader_client.post(self.add_url, {"text": "Thanks",
+                                               "parent": self.root.pk})
+        reply = Comment.objects.get(text="Thanks")
+        self.assertEqual(reply.parent, self.root)
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(Comment.objects.get(pk=self.root.pk).replies_count,
+                         11)
+
+    def test_reply_form_names_the_comment(self):
+        response = self.reader_client.get(self.url,
+                                          {"reply_to": self.root.pk})
+        self.assertContains(response, f'name="parent" value="{self.root.pk}"')
+
+    def test_reply_to_comment_of_other_post_is_not_found(self):
+        other = Post.objects.create(text="Wolfsbane", author=self.author)
+        comment = Comment.objects.create(text="Bitter", author=self.author,
+                                         post=other)
+        response = self.reader_client.post(self.add_url,
+                                           {"text": "Hm",
+                                            "parent": comment.pk})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text="Hm").exists())
+
+    def test_thread_benchmark(self):
+        out = StringIO()
+        call_command("bench_comment_threads", size=40, iterations=1,
+                     stdout=out)
+        for scenario in ("deep path", "deep per level", "wide path",
+                         "first page"):
+            self.assertIn(f"{scenario} ", out.getvalue())
+        self.assertFalse(Post.objects.filter(text="Benchmark").exists())
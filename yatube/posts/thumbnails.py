@@ -0,0 +1,119 @@
+"""Thumbnails of post images, made off the request path.
+
+Saving a post with a new image queues ``make_thumbnails`` on the
+``images`` queue of ``posts.tasks``. Until it is done the card shows a
+placeholder of the same size, so rendering a template never decodes,
+resizes or encodes an image. ``warm_thumbnails`` makes the missing ones
+of all posts at once, after a deploy or a change of the sizes.
+"""
+import hashlib
+import io
+import json
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from PIL import Image, ImageOps, features
+
+from . import feeds, timeline
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# the card image, cropped to the banner the templates reserve room for
+WIDTH, HEIGHT = 960, 339
+# narrower copies for narrow screens, the card image is the widest
+WIDTHS = (480, 720, WIDTH)
+# media type, extension, Pillow format and options of every encoding;
+# browsers without WebP fall back to the JPEG
+FORMATS = [("image/jpeg", "jpg", "JPEG",
+            {"quality": 85, "optimize": True, "progressive": True})]
+if features.check("webp"):
+    FORMATS.insert(0, ("image/webp", "webp", "WEBP", {"quality": 80}))
+
+
+def variants() -> list:
+    """``(media type, width, height)`` of every thumbnail of an image."""
+    return [(media_type, width, round(width * HEIGHT / WIDTH))
+            for media_type, *_ in FORMATS for width in WIDTHS]
+
+
+def thumbnail_names(image_name: str) -> list:
+    # a new image gets new names, so browsers never show a stale one
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    extensions = {media_type: ext for media_type, ext, *_ in FORMATS}
+    return [f"cache/posts/{digest}_{width}x{height}.{extensions[media_type]}"
+            for media_type, width, height in variants()]
+
+
+def renditions(names: list) -> list:
+    """What ``Post.renditions`` holds for the thumbnails ``names``."""
+    return [{"url": default_storage.url(name), "type": media_type,
+             "width": width, "height": height}
+            for name, (media_type, width, height) in zip(names, variants())]
+
+
+def _render(image_file) -> list:
+    with Image.open(image_file) as image:
+        image = ImageOps.fit(image.convert("RGB"), (WIDTH, HEIGHT),
+                             Image.LANCZOS)
+    encoders = {media_type: (name, options)
+                for media_type, _, name, options in FORMATS}
+    result = []
+    for media_type, width, height in variants():
+        # the narrow copies are scaled down from the cropped one
+        copy = (image if width == WIDTH
+                else image.resize((width, height), Image.LANCZOS))
+        buffer = io.BytesIO()
+        name, options = encoders[media_type]
+        copy.save(buffer, name, **options)
+        result.append(buffer.getvalue())
+    return result
+
+
+def render_thumbnails(image_name: str):
+    """Store the thumbnails of ``image_name`` unless they are there already.
+
+    Returns the names of the thumbnails, or None if the image cannot be
+    read. Touches the storage only, never the database, so it can run
+    in a worker process.
+    """
+    names = thumbnail_names(image_name)
+    if all(default_storage.exists(name) for name in names):
+        return names
+    try:
+        with default_storage.open(image_name, "rb") as image_file:
+            data = _render(image_file)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        # a missing or broken file keeps the placeholder
+        logger.warning("No thumbnail for %s", image_name, exc_info=True)
+        return None
+    for name, content in zip(names, data):
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+    return names
+
+
+def record_thumbnails(post, names: list) -> bool:
+    """Show the thumbnails ``names`` on the card of ``post``.
+
+    Does nothing if the image has been replaced in the meantime. The
+    caller bumps the feeds of the post and refreshes the followers of its
+    author if it returns True.
+    """
+    return bool(Post.objects.filter(pk=post.pk, image=post.image.name)
+                .update(thumbnails=json.dumps(renditions(names)),
+                        version=F('version') + 1))
+
+
+def make_thumbnails(post_id):
+    post = (Post.objects.filter(pk=post_id)
+            .only('image', 'author_id', 'group_id').first())
+    if post is None or not post.image:
+        return
+    names = render_thumbnails(post.image.name)
+    if names and record_thumbnails(post, names):
+        feeds.bump(*feeds.post_feeds(post.author_id, post.group_id))
+        timeline.refresh_followers_later(post.author_id)
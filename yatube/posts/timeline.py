@@ -0,0 +1,161 @@
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from . import feeds, tasks
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import FeedPaginator, TimelinePaginator
+
+BATCH_SIZE = 500
+
+FollowFeed = namedtuple('FollowFeed', 'posts paginator_class cache_key')
+
+
+def _is_celebrity(author_id) -> bool:
+    return UserStats.objects.filter(
+        pk=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT).exists()
+
+
+def _follower_batches(author_id):
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .values_list('user_id', flat=True))
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bump_follow_feeds(user_ids):
+    feeds.bump(*(feeds.follow_feed(user_id) for user_id in user_ids))
+
+
+def _store(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Deliver a new post to the timelines of its author's followers."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or _is_celebrity(post.author_id):
+        return
+    for user_ids in _follower_batches(post.author_id):
+        _store([TimelineEntry(user_id=user_id, post_id=post.pk,
+                              pub_date=post.pub_date)
+                for user_id in user_ids])
+        _bump_follow_feeds(user_ids)
+
+
+def refresh_followers(author_id):
+    """Start new generations of the follow feeds showing ``author_id``."""
+    if _is_celebrity(author_id):
+        # their followers' feeds are read on demand and never cached
+        return
+    for user_ids in _follower_batches(author_id):
+        _bump_follow_feeds(user_ids)
+
+
+def refresh_followers_later(author_id):
+    """Run ``refresh_followers`` once the current transaction commits.
+
+    It has a queue of its own, so deliveries of new posts do not wait for
+    it, and a call still waiting for the same author covers this one.
+    """
+    tasks.run(refresh_followers, author_id, queue='feeds', coalesce=True)
+
+
+def backfill(user_id, author_id):
+    """Copy the posts of a newly followed author into the timeline."""
+    if not _is_celebrity(author_id):
+        posts = (Post.objects.filter(author_id=author_id).order_by()
+                 .values_list('pk', 'pub_date'))
+        entries = []
+        for post_id, pub_date in posts.iterator():
+            entries.append(TimelineEntry(user_id=user_id, post_id=post_id,
+                                         pub_date=pub_date))
+            if len(entries) == BATCH_SIZE:
+                _store(entries)
+                entries = []
+        _store(entries)
+    _bump_follow_feeds([user_id])
+
+
+def purge(user_id, author_id):
+    """Drop the posts of an unfollowed author from the timeline."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+    _bump_follow_feeds([user_id])
+
+
+def rebuild(user_ids, since=None) -> tuple:
+    """Bring the timelines of ``user_ids`` in line with their follows.
+
+    Delivers the posts published after ``since``, or all of them, that a
+    lost fan-out or backfill missed, and drops the entries of authors no
+    longer followed. Returns the numbers of entries added and removed.
+    """
+    user_ids = list(user_ids)
+    entries = TimelineEntry.objects.filter(user_id__in=user_ids)
+    before = entries.count()
+
+    followed = Follow.objects.filter(user_id=OuterRef('user_id'),
+                                     author_id=OuterRef('post__author_id'))
+    stale = list(entries.annotate(followed=Exists(followed))
+                 .filter(followed=False).values_list('pk', flat=True))
+    TimelineEntry.objects.filter(pk__in=stale).delete()
+
+    followers = defaultdict(list)
+    follows = (Follow.objects.filter(user_id__in=user_ids)
+               .exclude(author__stats__followers_count__gt=(
+                   settings.TIMELINE_FANOUT_LIMIT))
+               .values_list('author_id', 'user_id'))
+    for author_id, user_id in follows:
+        followers[author_id].append(user_id)
+    posts = (Post.objects.filter(author_id__in=followers).order_by()
+             .values_list('pk', 'author_id', 'pub_date'))
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    batch = []
+    for post_id, author_id, pub_date in posts.iterator():
+        batch.extend(TimelineEntry(user_id=user_id, post_id=post_id,
+                                   pub_date=pub_date)
+                     for user_id in followers[author_id])
+        if len(batch) >= BATCH_SIZE:
+            _store(batch)
+            batch = []
+    _store(batch)
+
+    added = entries.count() - before + len(stale)
+    if added or stale:
+        _bump_follow_feeds(user_ids)
+    return added, len(stale)
+
+
+def follow_feed(user) -> FollowFeed:
+    """Return the follow feed of ``user`` and how to paginate it.
+
+    Authors with more than ``TIMELINE_FANOUT_LIMIT`` followers are not
+    fanned out; their posts are read on demand and merged in, and such
+    feeds are not cached.
+    """
+    celebrities = list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    if celebrities:
+        timeline = TimelineEntry.objects.filter(user=user).values('post_id')
+        posts = Post.objects.feed().filter(Q(pk__in=timeline)
+                                           | Q(author_id__in=celebrities))
+        return FollowFeed(posts, FeedPaginator, None)
+    entries = (TimelineEntry.objects.filter(user=user)
+               .select_related('post__author', 'post__group')
+               .order_by('-pub_date', '-post_id'))
+    return FollowFeed(entries, TimelinePaginator, feeds.follow_feed(user.pk))
@@ -0,0 +1,114 @@
+"""Normalization and storage of the images uploaded to posts.
+
+Camera originals are stored scaled down to ``POST_IMAGE_MAX_SIDE``,
+turned upright by their EXIF orientation and re-encoded without any
+metadata, so the storage, the backups and every later thumbnail pass
+deal with a small file of a known size.
+
+The stored file is named by the digest of its bytes, so posts with the
+same image share one file and one set of thumbnails. The posts referring
+to a file are its reference count: ``release`` deletes it once the last
+of them is gone, and ``dedupe_images`` folds the files stored before
+into one per content. A post may share a file while it is released, so
+both sides store the content again if the file is gone once the post is
+committed.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import Post
+from .thumbnails import render_thumbnails, thumbnail_names
+
+logger = logging.getLogger(__name__)
+
+# WebP keeps transparency and is the smaller one; JPEG is the fallback
+# for Pillow builds without it
+if features.check("webp"):
+    FORMAT, EXTENSION, OPTIONS = "WEBP", "webp", {"quality": 85}
+else:
+    FORMAT, EXTENSION, OPTIONS = "JPEG", "jpg", {
+        "quality": 85, "optimize": True, "progressive": True}
+
+
+def _has_alpha(image) -> bool:
+    return (image.mode in ("RGBA", "LA", "PA")
+            or "transparency" in image.info)
+
+
+def normalize(upload) -> ContentFile:
+    """The uploaded image, ready to be stored under ``content_name``.
+
+    The result has the ``width`` and ``height`` of the stored image.
+    Raises ``OSError`` if the image cannot be decoded.
+    """
+    side = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # JPEG decodes straight to a nearby smaller scale, so a camera
+        # original never takes its full size in memory
+        image.draft("RGB", (side, side))
+        keep_alpha = FORMAT != "JPEG" and _has_alpha(image)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+    image.thumbnail((side, side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    # no exif or icc_profile is passed on, so the metadata is dropped
+    image.save(buffer, FORMAT, **OPTIONS)
+    result = ContentFile(buffer.getvalue())
+    result.name = content_name(result, EXTENSION)
+    result.width, result.height = image.size
+    return result
+
+
+def content_name(content, extension: str) -> str:
+    """File name of ``content`` made of the digest of its bytes."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return f"{digest.hexdigest()}.{extension}"
+
+
+def store(name: str, content):
+    """Store ``content`` as ``name`` unless it is stored already.
+
+    A post sharing an image runs it once committed, in case the file was
+    released meanwhile.
+    """
+    if default_storage.exists(name):
+        return
+    stored = default_storage.save(name, content)
+    if stored != name:
+        # stored meanwhile by another process
+        default_storage.delete(stored)
+
+
+def release(name: str):
+    """Delete the image ``name`` and its thumbnails if no post refers to it.
+
+    Run it once the change letting go of the image is committed, so the
+    posts sharing the image are seen. A post sharing the image may be
+    committed while the files are deleted, so the content is read first
+    and stored again if a post refers to it afterwards.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    try:
+        with default_storage.open(name, "rb") as image_file:
+            content = ContentFile(image_file.read())
+    except (OSError, SuspiciousFileOperation):
+        content = None
+    for stored in [*thumbnail_names(name), name]:
+        try:
+            default_storage.delete(stored)
+        except (OSError, SuspiciousFileOperation):
+            logger.warning("Cannot delete %s", stored, exc_info=True)
+    if content is not None and Post.objects.filter(image=name).exists():
+        store(name, content)
+        render_thumbnails(name)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('new/', views.new_post, name="new_post"),
     path('follow/', views.follow_index, name="follow_index"),
     path('group/<slug:slug>/', views.group_posts, name="post_in_group"),
+    path('search/', views.search_posts, name="search"),
     path('<str:username>/', views.profile, name="profile"),
     path('<str:username>/follow/', views.profile_follow,
          name="profile_follow"),
@@ -19,6 +20,10 @@ urlpatterns = [
     path('<str:username>/<int:post_id>/', views.post_view, name="post"),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit, name="post_edit"),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments, name="post_comments"),
+    path('<str:username>/<int:post_id>/comments/<int:comment_id>/',
+         views.comment_thread, name="comment_thread"),
     path('<str:username>/<int:post_id>/comment/',
          views.add_comment, name="add_comment"),
 ]
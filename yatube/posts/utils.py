@@ -1,8 +1,68 @@
-from django.core.paginator import Paginator, Page
+from django.core.paginator import Page
 from django.conf import settings
 
+from . import caching, feeds
+from .paginators import CommentPaginator, FeedPaginator
 
-def _get_pages(request, page_list: object) -> Page:
-    paginator = Paginator(page_list, settings.PAGINATOR_PAGE_NUM)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+
+def _page_number(request) -> int:
+    try:
+        return int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _get_pages(request, page_list: object, cache_key: str = None,
+               paginator_class=FeedPaginator) -> Page:
+    """Return the requested page of ``page_list``.
+
+    ``?after=``/``?before=`` cursors are served by a keyset seek, the
+    legacy ``?page=N`` by offset. With ``cache_key`` only the rows of the
+    requested numbered page are cached, so the entry size depends on the
+    page size and not on the size of the table. Keys carry the feed
+    generation, so a write to the feed is visible on the next request.
+    Expired pages are recomputed by one request at a time. Such pages get
+    a ``cache_key`` to cache their markup under, other pages ``None``.
+    """
+    prefix = feeds.versioned(cache_key) if cache_key else None
+    paginator = paginator_class(page_list, settings.PAGINATOR_PAGE_NUM,
+                                count_key=prefix and f"{prefix}:count")
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        page = paginator.cursor_page(after=after, before=before)
+        page.cache_key = None
+        return page
+
+    page_number = _page_number(request)
+    if cache_key is None:
+        page = paginator.get_page(page_number)
+        page.cache_key = None
+        return page
+
+    key = f"{prefix}:{page_number}"
+
+    def compute():
+        page = paginator.get_page(page_number)
+        return paginator.count, page.number, list(page.object_list)
+
+    count, number, object_list = caching.get_or_set(
+        key, compute, settings.FEED_CACHE_TIMEOUT)
+    paginator.count = count
+    page = paginator.make_page(object_list, number)
+    page.cache_key = key
+    return page
+
+
+def _get_comments(request, post) -> Page:
+    """The newest threads of ``post`` or those after ``?after=``.
+
+    Threads are only paged by cursor, so a page costs one index seek
+    with the authors joined however many comments the post has, plus
+    one query for the first replies of each thread that has any.
+    """
+    paginator = CommentPaginator(
+        post.comments.threads().select_related('author'),
+        settings.COMMENTS_PAGE_NUM,
+        replies=settings.COMMENT_REPLIES_PREVIEW)
+    return paginator.cursor_page(after=request.GET.get('after'))
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
+from django.views.decorators.http import condition
 
-from .utils import _get_pages
-from .models import Post, Group, User, Follow
+from . import feeds, search, timeline
+from .utils import _get_comments, _get_pages
+from .models import Comment, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
 
 
@@ -20,29 +22,77 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
+def _etag(request, *parts) -> str:
+    # weak, as forms on the page get a new CSRF token every time
+    parts = "-".join(map(str, (*parts, request.user.pk or 0)))
+    return f'W/"{parts}"'
+
+
+def _feed_etag(request, feed: str) -> str:
+    return _etag(request, feeds.generation(feed))
+
+
+def _index_etag(request):
+    return _feed_etag(request, feeds.INDEX_FEED)
+
+
+def _group_etag(request, slug):
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('pk', flat=True).first())
+    if group_id is not None:
+        return _feed_etag(request, feeds.group_feed(group_id))
+
+
+def _profile_etag(request, username):
+    author_id = (User.objects.filter(username=username)
+                 .values_list('pk', flat=True).first())
+    if author_id is not None:
+        return _feed_etag(request, feeds.profile_feed(author_id))
+
+
+def _post_etag(request, username, post_id):
+    post = (Post.objects.filter(pk=post_id, author__username=username)
+            .order_by().values_list('author_id', 'version')[:1])
+    if post:
+        author_id, version = post[0]
+        # the author feed also changes with the author card
+        return _etag(request, version,
+                     feeds.generation(feeds.profile_feed(author_id)))
+
+
+def _comment_id(value):
+    return int(value) if value and value.isdigit() else None
+
+
+@condition(etag_func=_index_etag)
 def index(request):
-    post_list = cache.get("index_page")
-    if post_list is None:
-        post_list = Post.objects.all()
-        cache.set("index_page", post_list, timeout=20)
-    page = _get_pages(request, post_list)
+    feeds.cache_page(request, feeds.INDEX_FEED)
+    post_list = Post.objects.feed()
+    page = _get_pages(request, post_list, cache_key=feeds.INDEX_FEED)
     return render(request, "posts/index.html", {"page": page})
 
 
+@condition(etag_func=_group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page = _get_pages(request, posts)
+    feeds.cache_page(request, feeds.group_feed(group.pk))
+    posts = group.posts.feed()
+    page = _get_pages(request, posts,
+                      cache_key=feeds.group_feed(group.pk))
     context = {"group": group,
                "page": page}
     return render(request, "posts/group.html", context)
 
 
+@condition(etag_func=_profile_etag)
 def profile(request, username: str):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    feeds.cache_page(request, feeds.profile_feed(author.pk))
     user = request.user
-    posts = author.posts.all()
-    page = _get_pages(request, posts)
+    posts = author.posts.feed()
+    page = _get_pages(request, posts,
+                      cache_key=feeds.profile_feed(author.pk))
     following = (user.is_authenticated
                  and Follow.objects.filter(user=user, author=author).exists())
     context = {"author": author,
@@ -51,19 +101,56 @@ def profile(request, username: str):
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=_post_etag)
 def post_view(request, username: str, post_id: int):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    posts = Post.objects.feed().select_related('author__stats')
+    post = get_object_or_404(posts, pk=post_id, author__username=username)
     form = CommentForm()
     following = (request.user.is_authenticated
                  and post.author.following.filter(user=request.user).exists())
+    comments = _get_comments(request, post)
+    # the author feed changes with the post, its comments and the card;
+    # later comment pages are not worth caching
+    cache_key = None
+    if not request.GET.get('after'):
+        cache_key = (f"{feeds.versioned(feeds.profile_feed(post.author_id))}"
+                     f":post:{post.pk}")
     context = {"author": post.author,
                "post": post,
-               "comments": post.comments.all(),
+               "comments": comments,
                "form": form,
-               "following": following}
+               "following": following,
+               "reply_to": _comment_id(request.GET.get("reply_to")),
+               "cache_key": cache_key}
     return render(request, 'posts/post.html', context)
 
 
+def post_comments(request, username: str, post_id: int):
+    """Next page of the comments of a post as an HTML fragment."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             pk=post_id, author__username=username)
+    return render(request, "posts/includes/comment_list.html",
+                  {"post": post, "comments": _get_comments(request, post)})
+
+
+def comment_thread(request, username: str, post_id: int, comment_id: int):
+    """A whole comment thread as an HTML fragment, read in one query."""
+    comment = get_object_or_404(
+        Comment.objects.select_related('post__author'), pk=comment_id,
+        post_id=post_id, post__author__username=username)
+    thread = Comment.objects.subtree(comment).select_related('author')
+    return render(request, "posts/includes/comment_thread.html",
+                  {"post": comment.post, "thread": thread})
+
+
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    page = search.search_posts(query, settings.PAGINATOR_PAGE_NUM,
+                               after=request.GET.get("after"))
+    return render(request, "posts/search.html",
+                  {"query": query, "page": page})
+
+
 @login_required
 def post_edit(request, username: str, post_id: int):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
@@ -107,22 +194,29 @@ def new_post(request):
 def add_comment(request, username: str, post_id: int):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
     form = CommentForm(request.POST or None)
+    parent = None
+    parent_id = _comment_id(request.POST.get("parent"))
+    if parent_id is not None:
+        # one can only answer comments to the same post
+        parent = get_object_or_404(post.comments, pk=parent_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = parent
         comment.save()
         return redirect("posts:post", username=username, post_id=post_id)
     return render(request, "posts/includes/comments.html",
                   {"form": form,
-                   "post": post})
+                   "post": post,
+                   "reply_to": parent_id})
 
 
 @login_required
 def follow_index(request):
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    posts_list.order_by("-pub_date")
-    page = _get_pages(request, posts_list)
+    feed = timeline.follow_feed(request.user)
+    page = _get_pages(request, feed.posts, cache_key=feed.cache_key,
+                      paginator_class=feed.paginator_class)
     return render(request, "posts/follow.html", {"page": page})
 
 
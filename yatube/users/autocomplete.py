@@ -0,0 +1,172 @@
+"""In-memory prefix index of usernames and full names for autocomplete.
+
+Every process keeps a sorted list of ``(term, username)`` pairs, one per
+username, name, surname and full name. A lookup bisects to the first
+term with the prefix and walks over the matches, so no keystroke ever
+reaches ``auth_user``. Users who sign up in this process are added at
+once; those who sign up in other processes are picked up by primary key
+every ``AUTOCOMPLETE_REFRESH_INTERVAL`` seconds. Users renamed or deleted
+in this process are updated at once through signals, and the whole index
+is reloaded every ``AUTOCOMPLETE_RELOAD_INTERVAL`` seconds for the
+changes made in other processes. The reload runs on a queue of
+``posts.tasks`` while the current index keeps serving the lookups.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from posts import tasks
+
+User = get_user_model()
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+def _terms(username: str, full_name: str) -> set:
+    names = normalize(full_name)
+    return {normalize(username), names, *names.split()} - {""}
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._terms = []
+            # username -> (pk, full name) and pk -> username
+            self._names = {}
+            self._usernames = {}
+            self._last_pk = 0
+            self._refreshed_at = None
+            self._reloaded_at = None
+            # changes made during a reload, replayed on the new index
+            self._pending = None
+
+    def _entries(self, user) -> list:
+        self._last_pk = max(self._last_pk, user.pk or 0)
+        full_name = user.get_full_name()
+        if self._names.get(user.username) == (user.pk, full_name):
+            return []
+        self._discard(user.pk)
+        if user.username in self._names:
+            # the name was freed by a user deleted in another process
+            self._discard(self._names[user.username][0])
+        self._usernames[user.pk] = user.username
+        self._names[user.username] = (user.pk, full_name)
+        return [(term, user.username)
+                for term in _terms(user.username, full_name)]
+
+    def _discard(self, pk):
+        username = self._usernames.pop(pk, None)
+        if username is None:
+            return
+        _, full_name = self._names.pop(username)
+        for term in _terms(username, full_name):
+            i = bisect.bisect_left(self._terms, (term, username))
+            if i < len(self._terms) and self._terms[i] == (term, username):
+                del self._terms[i]
+
+    def _log(self, method: str, arg):
+        if self._pending is not None:
+            self._pending.append((method, arg))
+
+    def add(self, user):
+        """Index a user who has just signed up or changed their names."""
+        with self._lock:
+            self._log("add", user)
+            for entry in self._entries(user):
+                bisect.insort(self._terms, entry)
+
+    def discard(self, pk):
+        """Forget a deleted user."""
+        with self._lock:
+            self._log("discard", pk)
+            self._discard(pk)
+
+    def extend(self, users):
+        """Index many users with one sort."""
+        with self._lock:
+            new = [entry for user in users for entry in self._entries(user)]
+            if new:
+                # timsort takes the old terms as one sorted run, so
+                # this costs little more than sorting the new ones
+                self._terms.extend(new)
+                self._terms.sort()
+
+    def _users(self):
+        return User.objects.only('pk', 'username', 'first_name', 'last_name')
+
+    def refresh(self):
+        """Load the users who signed up since the last refresh."""
+        self.extend(list(self._users().filter(pk__gt=self._last_pk)
+                         .order_by('pk')))
+        self._refreshed_at = time.monotonic()
+
+    def reload(self):
+        """Rebuild the index from all users, dropping the deleted ones."""
+        # the other requests keep using the old index meanwhile
+        with self._lock:
+            self._reloaded_at = time.monotonic()
+            self._pending = []
+        fresh = PrefixIndex()
+        try:
+            fresh.extend(self._users().order_by('pk').iterator())
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for method, arg in self._pending:
+                getattr(fresh, method)(arg)
+            self._pending = None
+            self._terms = fresh._terms
+            self._names = fresh._names
+            self._usernames = fresh._usernames
+            self._last_pk = fresh._last_pk
+            self._refreshed_at = self._reloaded_at = time.monotonic()
+
+    @staticmethod
+    def _expired(checked_at, interval) -> bool:
+        return (checked_at is None
+                or time.monotonic() - checked_at > interval)
+
+    def lookup(self, prefix: str, limit: int) -> list:
+        """Users with a term starting with ``prefix``, in term order.
+
+        Returns ``(username, full name)`` pairs.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if self._reloaded_at is None:
+            # a process that did not load the index at start
+            self.reload()
+        elif self._expired(self._reloaded_at,
+                           settings.AUTOCOMPLETE_RELOAD_INTERVAL):
+            # asked for once; the reload resets the time when it starts
+            self._reloaded_at = time.monotonic()
+            tasks.run(self.reload, queue="autocomplete", coalesce=True)
+        elif self._expired(self._refreshed_at,
+                           settings.AUTOCOMPLETE_REFRESH_INTERVAL):
+            self.refresh()
+        found = {}
+        with self._lock:
+            terms = self._terms
+            i = bisect.bisect_left(terms, (prefix,))
+            while (i < len(terms) and len(found) < limit
+                   and terms[i][0].startswith(prefix)):
+                username = terms[i][1]
+                found.setdefault(username, self._names[username][1])
+                i += 1
+        return list(found.items())
+
+
+index = PrefixIndex()
@@ -0,0 +1,151 @@
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..autocomplete import PrefixIndex, index
+
+User = get_user_model()
+
+
+@override_settings(AUTOCOMPLETE_REFRESH_INTERVAL=60 * 60)
+class AutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User.objects.create(username="mcgonagall", first_name="Минерва",
+                            last_name="Макгонагалл")
+        User.objects.create(username="moody", first_name="Аластор",
+                            last_name="Грюм")
+        User.objects.create(username="mundungus", first_name="Наземникус",
+                            last_name="Флетчер")
+        cls.url = reverse("user_autocomplete")
+
+    def setUp(self) -> None:
+        index.clear()
+
+    def usernames(self, query):
+        response = self.client.get(self.url, {"q": query})
+        return [user["username"] for user in response.json()["results"]]
+
+    def test_prefix_of_username_or_name(self):
+        queries = {"m": ["mcgonagall", "moody", "mundungus"],
+                   "MO": ["moody"],
+                   "мин": ["mcgonagall"],
+                   "грю": ["moody"],
+                   "наземникус фл": ["mundungus"],
+                   "x": [],
+                   "": []}
+        for query, usernames in queries.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.usernames(query), usernames)
+
+    def test_result_links_to_profile(self):
+        response = self.client.get(self.url, {"q": "moo"})
+        self.assertEqual(response.json()["results"], [{
+            "username": "moody",
+            "full_name": "Аластор Грюм",
+            "url": reverse("posts:profile", args=["moody"]),
+        }])
+
+    @override_settings(AUTOCOMPLETE_LIMIT=2)
+    def test_results_are_limited(self):
+        self.assertEqual(self.usernames("m"), ["mcgonagall", "moody"])
+
+    def test_keystrokes_do_not_query_users(self):
+        self.usernames("m")
+        with self.assertNumQueries(0):
+            self.usernames("mo")
+
+    def test_signup_is_indexed_at_once(self):
+        self.usernames("m")
+        self.client.post(reverse("signup"), {
+            "first_name": "Нимфадора", "last_name": "Тонкс",
+            "username": "tonks", "email": "tonks@order.uk",
+            "password1": "Wotcher-1995", "password2": "Wotcher-1995"})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.usernames("нимф"), ["tonks"])
+
+    def test_users_of_other_processes_are_picked_up(self):
+        self.usernames("m")
+        # no signals, as with a user saved by another process
+        User.objects.bulk_create([User(username="lupin")])
+        self.assertEqual(self.usernames("lup"), [])
+        with override_settings(AUTOCOMPLETE_REFRESH_INTERVAL=0):
+            self.assertEqual(self.usernames("lup"), ["lupin"])
+
+    def test_renamed_and_deleted_users_are_updated_at_once(self):
+        self.usernames("m")
+        moody = User.objects.get(username="moody")
+        moody.username = "barty"
+        moody.first_name = "Барти"
+        moody.save()
+        User.objects.get(username="mundungus").delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.usernames("m"), ["mcgonagall"])
+            self.assertEqual(self.usernames("бар"), ["barty"])
+            self.assertEqual(self.usernames("ала"), [])
+
+    def test_changes_of_other_processes_are_reloaded(self):
+        # made without updating the index, as in another process
+        self.usernames("m")
+        User.objects.filter(username="moody").update(username="barty")
+        with mock.patch.object(index, "discard"):
+            User.objects.get(username="mundungus").delete()
+        self.assertEqual(self.usernames("m"),
+                         ["mcgonagall", "moody", "mundungus"])
+        with override_settings(AUTOCOMPLETE_RELOAD_INTERVAL=0):
+            self.assertEqual(self.usernames("m"), ["mcgonagall"])
+            self.assertEqual(self.usernames("bar"), ["barty"])
+
+    def test_reload_runs_off_the_request_path(self):
+        self.usernames("m")
+        with override_settings(AUTOCOMPLETE_RELOAD_INTERVAL=0), \
+                mock.patch("users.autocomplete.tasks.run") as run, \
+                self.assertNumQueries(0):
+            self.assertEqual(index.lookup("mo", 10),
+                             [("moody", "Аластор Грюм")])
+        run.assert_called_once_with(index.reload, queue="autocomplete",
+                                    coalesce=True)
+
+    def test_changes_during_reload_are_kept(self):
+        self.usernames("m")
+        extend = PrefixIndex.extend
+
+        def rename_meanwhile(prefixes, users):
+            users = list(users)
+            moody = User.objects.get(username="moody")
+            moody.username = "barty"
+            moody.save()
+            extend(prefixes, users)
+
+        with mock.patch.object(PrefixIndex, "extend", rename_meanwhile):
+            index.reload()
+        self.assertEqual(self.usernames("m"), ["mcgonagall", "mundungus"])
+        self.assertEqual(self.usernames("bar"), ["barty"])
+
+    def test_name_of_user_deleted_elsewhere_can_be_taken(self):
+        self.usernames("m")
+        with mock.patch.object(index, "discard"):
+            User.objects.get(username="moody").delete()
+        User.objects.create(username="moody", first_name="Нимфадора")
+        self.assertEqual(self.usernames("moody"), ["moody"])
+        self.assertEqual(self.usernames("аластор"), [])
+        self.assertEqual(self.usernames("нимф"), ["moody"])
+
+    def test_lookup_takes_well_under_a_millisecond(self):
+        prefixes = PrefixIndex()
+        prefixes.reload()
+        prefixes.extend(User(pk=pk, username=f"user{pk}",
+                             first_name=f"Имя{pk}", last_name="Уизли")
+                        for pk in range(1, 20001))
+        timings = []
+        for pk in range(1, 20001, 100):
+            start = time.perf_counter()
+            prefixes.lookup(f"имя{pk}", 10)
+            timings.append(time.perf_counter() - start)
+        self.assertLess(statistics.median(timings), 0.001)
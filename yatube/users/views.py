@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse, reverse_lazy
 from django.views.generic import CreateView
-from django.urls import reverse_lazy
 
+from . import autocomplete
 from .forms import CreationForm
 
 
@@ -8,3 +11,15 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('login')
     template_name = "signup.html"
+
+
+def user_autocomplete(request):
+    """Users whose username or name starts with ``?q=``, as JSON."""
+    users = autocomplete.index.lookup(request.GET.get('q', ''),
+                                      settings.AUTOCOMPLETE_LIMIT)
+    return JsonResponse({"results": [
+        {"username": username,
+         "full_name": full_name,
+         "url": reverse('posts:profile', args=[username])}
+        for username, full_name in users
+    ]})
@@ -0,0 +1,280 @@
+"""Cache backend shared by every worker process on a host.
+
+Entries live in a memory-mapped file, preferably on tmpfs such as
+``/dev/shm``. The file is a set-associative hash table: a key hashes to
+a set of ``WAYS`` fixed-size slots and evicts the least recently used
+slot of its set when the set is full. Each set has its own lock, so
+processes working with different keys rarely wait for each other.
+
+::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache_backends.shared.SharedMemoryCache',
+            'LOCATION': '/dev/shm/yatube-cache',
+            'OPTIONS': {'MAX_ENTRIES': 4096, 'MAX_VALUE_SIZE': 64 * 1024},
+        }
+    }
+
+Pickled values larger than ``MAX_VALUE_SIZE`` bytes are not stored.
+Changing the options requires removing the file.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b"YTBCACHE"
+FORMAT_VERSION = 1
+# magic, format version, number of sets, slot size
+HEADER = struct.Struct("<8sIII")
+# the slots start on the second page of the file
+DATA_OFFSET = mmap.PAGESIZE
+# key digest, expiry time (0 for never), last access time, value length
+SLOT = struct.Struct("<16sddI4x")
+ACCESSED = struct.Struct("<d")
+ACCESSED_OFFSET = 24
+EMPTY = bytes(16)
+WAYS = 8
+DEFAULT_VALUE_SIZE = 64 * 1024
+
+
+class _Region:
+    """The mapped cache file as seen by the current process."""
+
+    def __init__(self, path: str, sets: int, slot_size: int):
+        self.path = path
+        self.sets = sets
+        self.slot_size = slot_size
+        self.set_size = WAYS * slot_size
+        size = DATA_OFFSET + sets * self.set_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._initialize(size)
+            self.map = mmap.mmap(self.fd, size)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        # fcntl locks only exclude other processes, threads of this one
+        # are excluded by these
+        self.locks = [threading.Lock() for _ in range(sets)]
+
+    def _initialize(self, size: int):
+        expected = HEADER.pack(MAGIC, FORMAT_VERSION, self.sets,
+                               self.slot_size)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if not header.startswith(MAGIC):
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, expected, 0)
+            elif header != expected:
+                raise ImproperlyConfigured(
+                    f"Cache file {self.path} was created with other "
+                    f"options, remove it to apply the new ones.")
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER.size, 0)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    @contextmanager
+    def locked(self, index: int):
+        """Lock set ``index`` and yield the offset of its first slot."""
+        offset = DATA_OFFSET + index * self.set_size
+        with self.locks[index]:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield offset
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset)
+
+    def slots(self, base: int):
+        for way in range(WAYS):
+            offset = base + way * self.slot_size
+            yield offset, SLOT.unpack_from(self.map, offset)
+
+    def find(self, base: int, digest: bytes, now: float):
+        """Offset of the live slot holding ``digest`` or None."""
+        for offset, (stored, expires, _, _) in self.slots(base):
+            if stored == digest:
+                return None if 0 < expires <= now else offset
+        return None
+
+    def victim(self, base: int, digest: bytes, now: float) -> int:
+        """Slot to store ``digest`` in: its own, a free or the LRU one."""
+        victim, oldest = None, None
+        for offset, (stored, expires, accessed, _) in self.slots(base):
+            if stored == digest:
+                return offset
+            if stored == EMPTY or 0 < expires <= now:
+                accessed = -1.0
+            if oldest is None or accessed < oldest:
+                victim, oldest = offset, accessed
+        return victim
+
+    def read(self, offset: int, now: float) -> bytes:
+        length = SLOT.unpack_from(self.map, offset)[3]
+        start = offset + SLOT.size
+        ACCESSED.pack_into(self.map, offset + ACCESSED_OFFSET, now)
+        return self.map[start:start + length]
+
+    def write(self, offset: int, digest: bytes, expires: float,
+              data: bytes, now: float):
+        start = offset + SLOT.size
+        self.map[start:start + len(data)] = data
+        SLOT.pack_into(self.map, offset, digest, expires, now, len(data))
+
+    def expires(self, offset: int) -> float:
+        return SLOT.unpack_from(self.map, offset)[1]
+
+    def free(self, offset: int):
+        self.map[offset:offset + len(EMPTY)] = EMPTY
+
+
+_regions = {}
+_regions_lock = threading.Lock()
+
+
+def _forget_regions():
+    # a forked worker must not share fcntl lock ownership or thread
+    # locks with its parent, so it maps the file anew
+    global _regions_lock
+    for region in _regions.values():
+        region.close()
+    _regions.clear()
+    _regions_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_regions)
+
+
+def _region(path: str, sets: int, slot_size: int) -> _Region:
+    with _regions_lock:
+        region = _regions.get(path)
+        if region is None:
+            region = _regions[path] = _Region(path, sets, slot_size)
+    if (region.sets, region.slot_size) != (sets, slot_size):
+        raise ImproperlyConfigured(
+            f"Cache file {path} is configured twice with other options.")
+    return region
+
+
+class SharedMemoryCache(BaseCache):
+    """Cache in a memory-mapped file shared by the processes of a host."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._value_size = int(options.get('MAX_VALUE_SIZE',
+                                           DEFAULT_VALUE_SIZE))
+        self._sets = max(1, -(-self._max_entries // WAYS))
+
+    @property
+    def _region(self) -> _Region:
+        return _region(self._path, self._sets,
+                       SLOT.size + self._value_size)
+
+    def _locate(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return digest, int.from_bytes(digest[:8], 'little') % self._sets
+
+    def _expires(self, timeout) -> float:
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._value_size:
+            return False
+        digest, index = self._locate(key, version)
+        region = self._region
+        now = time.time()
+        with region.locked(index) as base:
+            if region.find(base, digest, now) is not None:
+                return False
+            offset = region.victim(base, digest, now)
+            region.write(offset, digest, self._expires(timeout), data, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        digest, index = self._locate(key, version)
+        region = self._region
+        now = time.time()
+        with region.locked(index) as base:
+            offset = region.find(base, digest, now)
+            if offset is None:
+                return default
+            data = region.read(offset, now)
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._value_size:
+            # do not keep serving the previous value
+            self.delete(key, version=version)
+            return
+        digest, index = self._locate(key, version)
+        region = self._region
+        now = time.time()
+        with region.locked(index) as base:
+            offset = region.victim(base, digest, now)
+            region.write(offset, digest, self._expires(timeout), data, now)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        digest, index = self._locate(key, version)
+        region = self._region
+        now = time.time()
+        with region.locked(index) as base:
+            offset = region.find(base, digest, now)
+            if offset is None:
+                return False
+            data = region.read(offset, now)
+            region.write(offset, digest, self._expires(timeout), data, now)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        digest, index = self._locate(key, version)
+        region = self._region
+        now = time.time()
+        with region.locked(index) as base:
+            offset = region.find(base, digest, now)
+            if offset is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(region.read(offset, now)) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            region.write(offset, digest, region.expires(offset), data, now)
+        return value
+
+    def has_key(self, key, version=None):
+        digest, index = self._locate(key, version)
+        region = self._region
+        with region.locked(index) as base:
+            return region.find(base, digest, time.time()) is not None
+
+    def delete(self, key, version=None):
+        digest, index = self._locate(key, version)
+        region = self._region
+        with region.locked(index) as base:
+            offset = region.find(base, digest, time.time())
+            if offset is not None:
+                region.free(offset)
+
+    def clear(self):
+        region = self._region
+        for index in range(self._sets):
+            with region.locked(index) as base:
+                for offset, _ in region.slots(base):
+                    region.free(offset)
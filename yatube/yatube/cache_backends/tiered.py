@@ -0,0 +1,265 @@
+"""Per-process LRU in front of a cache shared by the workers of a host.
+
+Hot entries are served from a small dict of this process without asking
+the shared cache or unpickling them. The values are shared by all the
+threads of the process, so callers must not change them.
+
+Every write goes to the shared tier and bumps one of ``STAMP_BUCKETS``
+version stamps kept there. Each process polls the stamps with one
+``get_many`` at most every ``POLL_INTERVAL`` seconds and drops its local
+entries of the buckets another process wrote to. Local entries also
+expire after ``LOCAL_TIMEOUT`` seconds whatever happens.
+
+::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache_backends.tiered.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'MAX_ENTRIES': 500, 'LOCAL_TIMEOUT': 5},
+        },
+        'shared': {...},
+    }
+
+Hits of each tier are counted per process and added to counters in the
+shared tier on every poll, see ``manage.py cache_stats``.
+"""
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+TIERS = ('local', 'shared', 'miss')
+
+
+class _LocalTier:
+    """Bounded LRU of one process, shared by its threads."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> (value, expires, bucket)
+        self.entries = OrderedDict()
+        self.stamps = {}
+        self.polled = None
+        self.hits = Counter()
+        self.unflushed = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires, _ = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, timeout: float, bucket: int):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout, bucket)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def update_stamps(self, stamps: dict):
+        """Drop the entries of every bucket whose stamp changed."""
+        with self.lock:
+            changed = {bucket for bucket, stamp in stamps.items()
+                       if stamp != self.stamps.get(bucket)}
+            self.stamps = stamps
+            if changed:
+                for key in [key for key, (_, _, bucket)
+                            in self.entries.items() if bucket in changed]:
+                    del self.entries[key]
+
+    def advance_stamp(self, bucket: int, stamp: int):
+        """Take our own write to ``bucket`` into account.
+
+        Unless somebody else wrote to the bucket since the last poll,
+        the entries of the bucket stay valid.
+        """
+        with self.lock:
+            if (self.stamps.get(bucket) or 0) == stamp - 1:
+                self.stamps[bucket] = stamp
+
+    def count(self, tier: str):
+        with self.lock:
+            self.hits[tier] += 1
+            self.unflushed[tier] += 1
+
+    def take_unflushed(self) -> Counter:
+        with self.lock:
+            unflushed, self.unflushed = self.unflushed, Counter()
+            return unflushed
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+def _forget_local_tiers():
+    # a forked worker starts with an empty tier and its own counters
+    global _local_tiers_lock
+    _local_tiers.clear()
+    _local_tiers_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_local_tiers)
+
+
+class TieredCache(BaseCache):
+    """In-process LRU with short TTLs in front of the ``LOCATION`` alias."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._alias = location
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._poll_interval = float(options.get('POLL_INTERVAL', 1))
+        self._buckets = int(options.get('STAMP_BUCKETS', 16))
+        self._stamp_keys = [f'tiered:stamp:{bucket}'
+                            for bucket in range(self._buckets)]
+
+    @property
+    def _shared(self) -> BaseCache:
+        return caches[self._alias]
+
+    @property
+    def _local(self) -> _LocalTier:
+        with _local_tiers_lock:
+            tier = _local_tiers.get(self._alias)
+            if tier is None:
+                tier = _local_tiers[self._alias] = _LocalTier(
+                    self._max_entries)
+            return tier
+
+    def _local_key(self, key, version) -> str:
+        return self._shared.make_key(key, version=version)
+
+    def _bucket(self, local_key: str) -> int:
+        return zlib.crc32(local_key.encode()) % self._buckets
+
+    def _add_to(self, key: str, delta: int) -> int:
+        try:
+            return self._shared.incr(key, delta)
+        except ValueError:
+            if self._shared.add(key, delta, timeout=None):
+                return delta
+            return self._shared.incr(key, delta)
+
+    def _poll(self, local: _LocalTier, force: bool = False):
+        now = time.monotonic()
+        recent = (local.polled is not None
+                  and now - local.polled < self._poll_interval)
+        if recent and not force:
+            return
+        local.polled = now
+        found = self._shared.get_many(self._stamp_keys)
+        local.update_stamps({bucket: found.get(key)
+                             for bucket, key in enumerate(self._stamp_keys)})
+        for tier, hits in local.take_unflushed().items():
+            self._add_to(f'tiered:hits:{tier}', hits)
+
+    def _local_ttl(self, timeout) -> float:
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._shared.default_timeout
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _written(self, key, version, value=MISSING, timeout=DEFAULT_TIMEOUT):
+        local_key = self._local_key(key, version)
+        bucket = self._bucket(local_key)
+        stamp = self._add_to(self._stamp_keys[bucket], 1)
+        local = self._local
+        local.advance_stamp(bucket, stamp)
+        if value is MISSING:
+            local.pop(local_key)
+            return
+        # a copy, as the caller may go on changing the value it stored
+        value = pickle.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        local.put(local_key, value, self._local_ttl(timeout), bucket)
+
+    def get(self, key, default=None, version=None):
+        local = self._local
+        self._poll(local)
+        local_key = self._local_key(key, version)
+        value = local.get(local_key)
+        if value is not MISSING:
+            local.count('local')
+            return value
+        value = self._shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            local.count('miss')
+            return default
+        local.count('shared')
+        local.put(local_key, value, self._local_timeout,
+                  self._bucket(local_key))
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set(key, value, timeout=timeout, version=version)
+        self._written(key, version, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._written(key, version, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._shared.touch(key, timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self._shared.incr(key, delta, version=version)
+        self._written(key, version, value)
+        return value
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        return (self._local.get(local_key) is not MISSING
+                or self._shared.has_key(key, version=version))
+
+    def delete(self, key, version=None):
+        self._shared.delete(key, version=version)
+        self._written(key, version)
+
+    def clear(self):
+        self._shared.clear()
+        with _local_tiers_lock:
+            _local_tiers.pop(self._alias, None)
+
+    def stats(self) -> dict:
+        """Hits per tier: ``process`` of this process, ``total`` of all.
+
+        The totals include what the other processes flushed on their
+        last poll.
+        """
+        local = self._local
+        self._poll(local, force=True)
+        totals = self._shared.get_many(
+            [f'tiered:hits:{tier}' for tier in TIERS])
+        return {
+            'process': {tier: local.hits[tier] for tier in TIERS},
+            'total': {tier: totals.get(f'tiered:hits:{tier}', 0)
+                      for tier in TIERS},
+        }
+
+    def reset_stats(self):
+        local = self._local
+        local.take_unflushed()
+        local.hits.clear()
+        self._shared.delete_many([f'tiered:hits:{tier}' for tier in TIERS])
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +76,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -149,4 +152,71 @@ CACHES = {
     }
 }
 
+# File shared by every worker process on the host, e.g. on /dev/shm;
+# without it each process keeps a cache of its own
+SHARED_CACHE_PATH = env('SHARED_CACHE_PATH', default='')
+if SHARED_CACHE_PATH:
+    # hot entries are also kept for a few seconds in every process
+    CACHES['default'] = {
+        'BACKEND': 'yatube.cache_backends.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': 500, 'LOCAL_TIMEOUT': 5},
+    }
+    CACHES['shared'] = {
+        'BACKEND': 'yatube.cache_backends.shared.SharedMemoryCache',
+        'LOCATION': SHARED_CACHE_PATH,
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('SHARED_CACHE_ENTRIES', default=4096),
+            'MAX_VALUE_SIZE': 64 * 1024,
+        },
+    }
+
 PAGINATOR_PAGE_NUM = 10
+
+# Comments shown on a post page and loaded by each "more" click
+COMMENTS_PAGE_NUM = 20
+
+# Longest side of a stored post image; larger uploads are scaled down
+POST_IMAGE_MAX_SIDE = 2048
+
+# Replies shown under each comment thread before "show the whole thread"
+COMMENT_REPLIES_PREVIEW = 3
+
+# Seconds a cached feed page is kept; writes to the feed start a new
+# generation of its cache keys instead of waiting for the timeout.
+# Without a shared cache a new generation is seen only by the process
+# that wrote, so the others must not keep their entries for long
+UNSHARED_CACHE_TIMEOUT = 20
+FEED_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE_PATH else UNSHARED_CACHE_TIMEOUT
+
+# Run background tasks inline, still after the commit, instead of in a
+# worker thread; the tests turn it on, see yatube.test_runner
+POSTS_TASKS_EAGER = env.bool('POSTS_TASKS_EAGER', default=False)
+
+# Authors with more followers are not fanned out to follower timelines
+TIMELINE_FANOUT_LIMIT = 10000
+
+# Seconds the total count of a feed generation is cached
+FEED_COUNT_TIMEOUT = FEED_CACHE_TIMEOUT
+
+# Seconds an expired feed entry may still be served while one request
+# recomputes it
+FEED_CACHE_STALE_TIMEOUT = 5 * 60
+
+# Seconds a request may hold the lock for recomputing a feed entry
+FEED_CACHE_LOCK_TIMEOUT = 10
+
+# Seconds a page rendered for a reader without a session is served to
+# other such readers; writes to its feeds replace it earlier
+ANONYMOUS_PAGE_CACHE_TIMEOUT = (5 * 60 if SHARED_CACHE_PATH
+                                else UNSHARED_CACHE_TIMEOUT)
+
+# Users suggested for a prefix typed in the author search
+AUTOCOMPLETE_LIMIT = 10
+
+# Seconds between checks for users who signed up in other processes
+AUTOCOMPLETE_REFRESH_INTERVAL = 5
+
+# Seconds between full reloads picking up users renamed or deleted in
+# other processes
+AUTOCOMPLETE_RELOAD_INTERVAL = 5 * 60
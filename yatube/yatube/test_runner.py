@@ -0,0 +1,30 @@
+"""Test runner running the background tasks of posts inline.
+
+Every test runs in a transaction that is rolled back, so callbacks
+waiting for its commit would never fire. Here they run right away, as if
+every statement were committed at once.
+"""
+from unittest import mock
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def run_now(func, using=None):
+    func()
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._patches = [override_settings(POSTS_TASKS_EAGER=True),
+                         mock.patch("django.db.transaction.on_commit",
+                                    run_now)]
+        for patch in self._patches:
+            patch.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        for patch in reversed(self._patches):
+            patch.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from ..cache_backends.shared import WAYS, SharedMemoryCache
+
+PROCESSES = 4
+
+
+def make_cache(path, **options):
+    options.setdefault('MAX_ENTRIES', 64)
+    options.setdefault('MAX_VALUE_SIZE', 1024)
+    return SharedMemoryCache(path, {'OPTIONS': options})
+
+
+def increment(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def add_once(path, queue):
+    queue.put(make_cache(path).add('winner', os.getpid()))
+
+
+def write_and_read(path, worker, queue):
+    cache = make_cache(path)
+    errors = 0
+    for i in range(200):
+        key = f'{worker}:{i % 16}'
+        cache.set(key, [worker, i] * 10)
+        value = cache.get(key)
+        # another process may evict it, but never change it
+        if value is not None and value != [worker, i] * 10:
+            errors += 1
+    queue.put(errors)
+
+
+class SharedMemoryCacheTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache')
+        self.cache = make_cache(self.path)
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', {'posts': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'posts': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_add_keeps_live_value(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_incr(self):
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.incr('key', 10), 11)
+        self.assertEqual(self.cache.decr('key'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiry_and_touch(self):
+        self.cache.set('short', 1, timeout=0.2)
+        self.cache.set('touched', 1, timeout=0.2)
+        self.assertTrue(self.cache.touch('touched', timeout=None))
+        time.sleep(0.3)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertEqual(self.cache.get('touched'), 1)
+
+    def test_clear(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_too_large_value_is_not_stored(self):
+        self.cache.set('key', 'small')
+        self.cache.set('key', 'x' * 2048)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.add('key', 'x' * 2048))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = make_cache(self.path + '-lru', MAX_ENTRIES=WAYS)
+        for i in range(WAYS):
+            cache.set(i, i)
+        cache.get(0)
+        cache.set('new', 'new')
+        self.assertEqual(cache.get(0), 0)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get('new'), 'new')
+
+    def test_other_options_for_existing_file_are_rejected(self):
+        self.cache.set('key', 1)
+        with self.assertRaises(ImproperlyConfigured):
+            make_cache(self.path, MAX_ENTRIES=128).get('key')
+
+
+class SharedMemoryCacheProcessesTest(SimpleTestCase):
+    """Several processes working with one cache file at once."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache')
+        self.cache = make_cache(self.path)
+        self.context = multiprocessing.get_context('fork')
+
+    def run_processes(self, target, args):
+        processes = [self.context.Process(target=target, args=args(i))
+                     for i in range(PROCESSES)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=30)
+            self.assertEqual(process.exitcode, 0)
+
+    def test_values_are_seen_by_other_processes(self):
+        queue = self.context.Queue()
+        self.cache.set('winner', 'parent')
+
+        def read(path, queue):
+            queue.put(make_cache(path).get('winner'))
+
+        self.run_processes(read, lambda i: (self.path, queue))
+        self.assertEqual([queue.get() for _ in range(PROCESSES)],
+                         ['parent'] * PROCESSES)
+
+    def test_concurrent_incr_loses_no_updates(self):
+        self.cache.set('counter', 0)
+        self.run_processes(increment, lambda i: (self.path, 500))
+        self.assertEqual(self.cache.get('counter'), PROCESSES * 500)
+
+    def test_concurrent_add_has_one_winner(self):
+        queue = self.context.Queue()
+        self.run_processes(add_once, lambda i: (self.path, queue))
+        results = [queue.get() for _ in range(PROCESSES)]
+        self.assertEqual(results.count(True), 1)
+
+    def test_concurrent_writes_are_not_torn(self):
+        queue = self.context.Queue()
+        self.run_processes(write_and_read, lambda i: (self.path, i, queue))
+        self.assertEqual([queue.get() for _ in range(PROCESSES)],
+                         [0] * PROCESSES)
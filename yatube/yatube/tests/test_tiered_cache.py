@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+
+def tiered_caches(path, **options):
+    options.setdefault('POLL_INTERVAL', 0)
+    return {
+        'default': {
+            'BACKEND': 'yatube.cache_backends.tiered.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': options,
+        },
+        'shared': {
+            'BACKEND': 'yatube.cache_backends.shared.SharedMemoryCache',
+            'LOCATION': path,
+        },
+    }
+
+
+class TieredCacheTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache')
+        self.use_caches()
+        self.context = multiprocessing.get_context('fork')
+
+    def use_caches(self, **options):
+        override = override_settings(CACHES=tiered_caches(self.path,
+                                                          **options))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.cache = caches['default']
+        self.cache.clear()
+        self.cache.reset_stats()
+
+    def in_other_process(self, func):
+        process = self.context.Process(target=func)
+        process.start()
+        process.join(timeout=30)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_hot_key_is_served_from_process(self):
+        caches['shared'].set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.stats()['process'],
+                         {'local': 1, 'shared': 1, 'miss': 1})
+
+    def test_stored_value_is_copied(self):
+        value = ['a']
+        self.cache.set('key', value)
+        value.append('b')
+        self.assertEqual(self.cache.get('key'), ['a'])
+
+    def test_write_of_other_process_is_seen_after_poll(self):
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.get('key'), 1)
+        self.in_other_process(lambda: caches['default'].set('key', 2))
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_local_entries_expire_between_polls(self):
+        self.use_caches(POLL_INTERVAL=60, LOCAL_TIMEOUT=0.2)
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.get('key'), 1)
+        self.in_other_process(lambda: caches['default'].incr('key'))
+        self.assertEqual(self.cache.get('key'), 1)
+        time.sleep(0.3)
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_local_tier_is_bounded(self):
+        self.use_caches(MAX_ENTRIES=2, POLL_INTERVAL=60)
+        for key in 'abc':
+            self.cache.set(key, key)
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertEqual(self.cache.get('c'), 'c')
+        self.assertEqual(self.cache.stats()['process'],
+                         {'local': 1, 'shared': 1, 'miss': 0})
+
+    def test_stats_add_up_all_processes(self):
+        self.cache.set('key', 1)
+
+        def read():
+            cache = caches['default']
+            cache.get('key')
+            cache.get('key')
+            cache.stats()
+
+        self.in_other_process(read)
+        self.assertEqual(self.cache.stats()['total'],
+                         {'local': 1, 'shared': 1, 'miss': 0})
+
+    def test_cache_stats_command(self):
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.cache.get('missing')
+        out = StringIO()
+        call_command('cache_stats', reset=True, stdout=out)
+        self.assertIn('default: 2 reads', out.getvalue())
+        self.assertIn('50.0%', out.getvalue())
+        self.assertEqual(self.cache.stats()['total'],
+                         {'local': 0, 'shared': 0, 'miss': 0})
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# load the author index before the first keystroke needs it
+from users.autocomplete import index  # noqa: E402
+
+index.reload()